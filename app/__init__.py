@@ -1,4 +1,3 @@
-import rq
 from flask import Flask
 from redis import Redis
 
@@ -8,30 +7,54 @@ from app.blueprints.commands import commands
 from app.blueprints.errors import errors
 from app.blueprints.main import main
 from app.blueprints.users import users
+from app.cache import FragmentCache, TokenCache
 from app.config import Config
-from app.extensions import bootstrap, db, login, mail, moment
+from app.database import init_db
+from app.emails import MailDispatcher
+from app.extensions import bootstrap, login, mail, moment
+from app.graph import create_graph
+from app.metrics import metrics
+from app.passwords import PasswordHasher
+from app.queues import create_queues
+from app.search import create_search
 
 
-def create_app():
+def create_app(config_class=Config, redis_class=None):
     app = Flask(__name__)
 
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
-    app.redis = Redis.from_url(app.config["REDIS_URL"])
-    app.task_queue = rq.Queue("microblog-tasks", connection=app.redis)
+    app.redis = (redis_class or Redis).from_url(app.config["REDIS_URL"])
+    app.task_queues = create_queues(app)
+    app.task_queue = app.task_queues["default"]
+    app.search = create_search(app)
+    app.graph = create_graph(app)
+    app.token_cache = TokenCache(
+        app.config["TOKEN_CACHE_SIZE"],
+        app.config["TOKEN_CACHE_TTL"],
+        app.redis,
+        app.config["TOKEN_CACHE_REDIS"],
+    )
+    app.fragment_cache = FragmentCache(
+        app.config["FRAGMENT_CACHE_SIZE"], app.config["FRAGMENT_CACHE_TTL"], app.redis
+    )
+    app.mail_dispatcher = MailDispatcher(app)
+    app.password_hasher = PasswordHasher(app)
 
     register_extensions(app)
     register_blueprints(app)
+    load_indexes(app)
 
     return app
 
 
 def register_extensions(app: Flask):
-    db.init_app(app)
+    init_db(app)
     login.init_app(app)
     bootstrap.init_app(app)
     moment.init_app(app)
     mail.init_app(app)
+    metrics.init_app(app)
 
 
 def register_blueprints(app: Flask):
@@ -41,3 +64,10 @@ def register_blueprints(app: Flask):
     app.register_blueprint(auth)
     app.register_blueprint(users, url_prefix="/user")
     app.register_blueprint(api, url_prefix="/api")
+
+
+def load_indexes(app: Flask):
+    with app.app_context():
+        app.search.preload()
+        if app.graph is not None:
+            app.graph.preload()
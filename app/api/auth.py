@@ -1,17 +1,39 @@
+import hashlib
+import hmac
+
+from flask import current_app
 from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth
 
 from app.api.errors import error_response
+from app.cache import TTLCache
 from app.extensions import db
 from app.models import User
 
 basic_auth = HTTPBasicAuth()
 token_auth = HTTPTokenAuth()
+password_cache = TTLCache()
 
 
 @basic_auth.verify_password
 def verify_password(username, password):
-    user = db.session.scalar(db.select(User).filter_by(username=username))
+    key = hmac.new(
+        current_app.config["SECRET_KEY"].encode(),
+        f"{username}:{password}".encode(),
+        hashlib.sha256,
+    ).digest()
+    cached = password_cache.get(key)
+    if cached is not None:
+        user = db.session.get(User, cached[0])
+        if user and user.password_hash == cached[1]:
+            return user
+    user = User.get_by_username(username)
     if user and user.check_password(password):
+        db.session.commit()
+        password_cache.set(
+            key,
+            (user.id, user.password_hash),
+            current_app.config["PASSWORD_CACHE_TTL"],
+        )
         return user
 
 
@@ -1,10 +1,22 @@
-from flask import abort, request, url_for
+from flask import abort, current_app, request, url_for
 
 from app.api import api
 from app.api.auth import token_auth
 from app.api.errors import bad_request
 from app.extensions import db
-from app.models import User
+from app.models import User, expire_fragments
+
+
+def pagination_args():
+    return {
+        "per_page": max(min(request.args.get("per_page", 10, type=int), 100), 1),
+        "page": request.args.get("page", type=int),
+        "after": request.args.get("after"),
+        "before": request.args.get("before"),
+        "count": request.args.get(
+            "count", False, type=lambda v: v.lower() in ("1", "true")
+        ),
+    }
 
 
 @api.get("/users/<int:id>")
@@ -16,19 +28,21 @@ def get_user(id):
 @api.get("/users")
 @token_auth.login_required
 def get_users():
-    page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("page", 10, type=int), 100)
-    return User.to_collection_dict(db.select(User), page, per_page, "api.get_users")
+    return User.to_collection_dict(
+        db.select(User), endpoint="api.get_users", **pagination_args()
+    )
 
 
 @api.get("/users/<int:id>/followers")
 @token_auth.login_required
 def get_followers(id):
     user = db.get_or_404(User, id)
-    page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("page", 10, type=int), 100)
+    args = pagination_args()
     return User.to_collection_dict(
-        user.followers.select(), page, per_page, "api.get_followers", id=id
+        user.relation_query("followers", **args),
+        endpoint="api.get_followers",
+        id=id,
+        **args,
     )
 
 
@@ -36,19 +50,32 @@ def get_followers(id):
 @token_auth.login_required
 def get_following(id):
     user = db.get_or_404(User, id)
-    page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("page", 10, type=int), 100)
+    args = pagination_args()
     return User.to_collection_dict(
-        user.following.select(), page, per_page, "api.get_following", id=id
+        user.relation_query("following", **args),
+        endpoint="api.get_following",
+        id=id,
+        **args,
     )
 
 
+@api.get("/users/<int:id>/suggestions")
+@token_auth.login_required
+def get_suggestions(id):
+    user = db.get_or_404(User, id)
+    limit = min(request.args.get("limit", 10, type=int), 100)
+    return {
+        "items": [item.to_dict() for item in user.suggestions(limit)],
+        "_links": {"self": url_for("api.get_suggestions", id=id, limit=limit)},
+    }
+
+
 @api.post("/users")
 def create_user():
     data = request.get_json()
     if "username" not in data or "email" not in data or "password" not in data:
         return bad_request("must include username, email and password fields")
-    if db.session.scalar(db.select(User).filter_by(username=data["username"])):
+    if User.get_by_username(data["username"]):
         return bad_request("please use a different username")
     if db.session.scalar(db.select(User).filter_by(email=data["email"])):
         return bad_request("please use a different email address")
@@ -69,7 +96,7 @@ def update_user(id):
     if (
         "username" in data
         and data["username"] != user.username
-        and db.session.scalar(db.select(User).filter_by(username=data["username"]))
+        and User.get_by_username(data["username"])
     ):
         return bad_request("please use a different username")
     if (
@@ -78,6 +105,10 @@ def update_user(id):
         and db.session.scalar(db.select(User).filter_by(email=data["email"]))
     ):
         return bad_request("please use a different email address")
+    username = user.username
     user.from_dict(data)
+    if user.username != username:
+        current_app.search.update_author(user)
+    expire_fragments("posts", f"user:{user.id}")
     db.session.commit()
     return user.to_dict()
@@ -0,0 +1,238 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from functools import partial
+
+import redis.asyncio
+import sqlalchemy as sa
+from asgiref.wsgi import WsgiToAsgi
+from flask_login import current_user
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.util import await_only
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from app import create_app
+from app.api.errors import error_response
+from app.blueprints.users import pending_notifications, sse_event
+from app.database import set_sqlite_pragmas
+from app.extensions import db
+
+READ_ENDPOINTS = {
+    "api.get_user",
+    "api.get_users",
+    "api.get_followers",
+    "api.get_following",
+    "api.get_suggestions",
+}
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite"}
+
+offloaded = ContextVar("offloaded", default=False)
+
+
+def offload(fn, *args, **kwargs):
+    if not offloaded.get():
+        return fn(*args, **kwargs)
+
+    def run():
+        offloaded.set(False)
+        return fn(*args, **kwargs)
+
+    return await_only(asyncio.to_thread(run))
+
+
+def notification_channel(session):
+    return current_user.is_authenticated and current_user.notification_channel
+
+
+class OffloadingPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        return offload(super().execute, raise_on_error)
+
+    def immediate_execute_command(self, *args, **options):
+        return offload(super().immediate_execute_command, *args, **options)
+
+
+class OffloadingRedis(redis.Redis):
+    """Redis client that runs commands sent from AsyncAPI views in a thread."""
+
+    def execute_command(self, *args, **options):
+        return offload(super().execute_command, *args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return OffloadingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def async_url(url):
+    url = sa.engine.make_url(url)
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {url.get_backend_name()}")
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+class AsyncAPI:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        self.engine = create_async_engine(
+            async_url(
+                config["DATABASE_REPLICA_URL"] or config["SQLALCHEMY_DATABASE_URI"]
+            )
+        )
+        if self.engine.dialect.name == "sqlite":
+            sa.event.listen(
+                self.engine.sync_engine,
+                "connect",
+                partial(set_sqlite_pragmas, config["SQLITE_PRAGMAS"]),
+            )
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.adapter = flask_app.url_map.bind("localhost")
+        self.fallback = WsgiToAsgi(flask_app)
+        self.redis = redis.asyncio.Redis.from_url(config["REDIS_URL"])
+
+    async def __call__(self, scope, receive, send):
+        endpoint = self.endpoint(scope) if scope["type"] == "http" else None
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif endpoint in READ_ENDPOINTS:
+            await self.dispatch(scope, send)
+        elif endpoint == "users.notification_stream" and scope["method"] == "GET":
+            await self.notification_stream(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await self.redis.aclose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def endpoint(self, scope):
+        try:
+            endpoint, _ = self.adapter.match(scope["path"], method=scope["method"])
+        except HTTPException:
+            return None
+        return endpoint
+
+    def environ(self, scope):
+        host, port = scope.get("server") or ("localhost", 80)
+        return EnvironBuilder(
+            path=scope["path"],
+            base_url=f"{scope['scheme']}://{host}:{port}{scope.get('root_path', '')}",
+            query_string=scope["query_string"].decode("latin-1"),
+            method=scope["method"],
+            headers=[
+                (name.decode("latin-1"), value.decode("latin-1"))
+                for name, value in scope["headers"]
+            ],
+        ).get_environ()
+
+    async def dispatch(self, scope, send):
+        offloaded.set(True)
+        with self.flask_app.request_context(self.environ(scope)):
+            async with self.sessionmaker() as session:
+                db.session.registry.set(session.sync_session)
+                try:
+                    response = await session.run_sync(
+                        lambda _: self.flask_app.full_dispatch_request()
+                    )
+                finally:
+                    db.session.registry.clear()
+        await self.respond(scope, send, response)
+
+    async def notification_stream(self, scope, receive, send):
+        config = self.flask_app.config
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        offloaded.set(True)
+        with self.flask_app.request_context(self.environ(scope)):
+            async with self.sessionmaker() as session:
+                db.session.registry.set(session.sync_session)
+                try:
+                    channel = await session.run_sync(notification_channel)
+                    if channel:
+                        await pubsub.subscribe(channel)
+                        backlog = await session.run_sync(
+                            lambda _: pending_notifications()
+                        )
+                    else:
+                        payload, status = error_response(401)
+                        response = self.flask_app.make_response((payload, status))
+                finally:
+                    db.session.registry.clear()
+        if not channel:
+            await pubsub.aclose()
+            await self.respond(scope, send, response)
+            return
+        disconnected = asyncio.ensure_future(self.disconnected(receive))
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"content-type", b"text/event-stream"),
+                        (b"cache-control", b"no-cache"),
+                        (b"x-accel-buffering", b"no"),
+                    ],
+                }
+            )
+            retry = config["NOTIFICATION_STREAM_RETRY"] * 1000
+            await self.send_event(
+                send, f"retry: {retry}\n\n" + "".join(map(sse_event, backlog))
+            )
+            deadline = (
+                asyncio.get_running_loop().time()
+                + config["NOTIFICATION_STREAM_TIMEOUT"]
+            )
+            while (
+                not disconnected.done() and asyncio.get_running_loop().time() < deadline
+            ):
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=config["NOTIFICATION_STREAM_KEEPALIVE"],
+                )
+                await self.send_event(
+                    send,
+                    (
+                        ": keepalive\n\n"
+                        if message is None
+                        else sse_event(json.loads(message["data"]))
+                    ),
+                )
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            disconnected.cancel()
+            await pubsub.aclose()
+
+    async def disconnected(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    async def send_event(self, send, event):
+        await send(
+            {"type": "http.response.body", "body": event.encode(), "more_body": True}
+        )
+
+    async def respond(self, scope, send, response):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in response.headers.items()
+                ],
+            }
+        )
+        body = b"" if scope["method"] == "HEAD" else response.get_data()
+        await send({"type": "http.response.body", "body": body})
+
+
+app = AsyncAPI(create_app(redis_class=OffloadingRedis))
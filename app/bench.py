@@ -0,0 +1,272 @@
+import json
+import os
+import random
+import subprocess
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from statistics import median, quantiles
+from time import perf_counter, sleep
+
+import rq
+import sqlalchemy as sa
+from flask import current_app
+
+from app.bulk import TABLES, load, rebuild_derived
+from app.config import Config, basedir
+from app.extensions import db
+from app.models import Post, User
+
+WORDS = [
+    "flask",
+    "python",
+    "redis",
+    "timeline",
+    "follow",
+    "post",
+    "message",
+    "search",
+    "index",
+    "query",
+    "cache",
+    "worker",
+    "queue",
+    "async",
+    "cursor",
+    "page",
+    "feed",
+    "user",
+    "profile",
+    "export",
+    "notify",
+]
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        "BENCH_DATABASE_URL", "sqlite:///" + os.path.join(basedir, "bench.sqlite")
+    )
+    WTF_CSRF_ENABLED = False
+
+
+def power_law_choices(rng, population, k, alpha=1.2):
+    weights = [1 / (rank + 1) ** alpha for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=k)
+
+
+def generate(users=1000, follows=20, posts=10000, messages=2000, seed=42):
+    rng = random.Random(seed)
+    now = datetime.now(UTC)
+    password_hash = current_app.password_hasher.hash("password")
+
+    ids = list(range(1, users + 1))
+    load(
+        TABLES["users"],
+        (
+            {
+                "id": id,
+                "username": f"user{id}",
+                "email": f"user{id}@example.com",
+                "password_hash": password_hash,
+                "last_seen": now,
+            }
+            for id in ids
+        ),
+    )
+    edges = set()
+    for id in ids:
+        for target in power_law_choices(rng, ids, rng.randint(1, follows * 2)):
+            if target != id:
+                edges.add((id, target))
+    load(
+        TABLES["follows"],
+        ({"follower_id": a, "following_id": b} for a, b in sorted(edges)),
+    )
+    load(
+        TABLES["posts"],
+        (
+            {
+                "body": " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                "timestamp": now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+                "user_id": author,
+            }
+            for author in power_law_choices(rng, ids, posts)
+        ),
+    )
+    load(
+        TABLES["messages"],
+        (
+            {
+                "sender_id": rng.choice(ids),
+                "recipient_id": recipient,
+                "body": " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                "timestamp": now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+            }
+            for recipient in power_law_choices(rng, ids, messages)
+        ),
+    )
+    rebuild_derived()
+    db.session.commit()
+    return {
+        "users": users,
+        "follows": len(edges),
+        "posts": posts,
+        "messages": messages,
+    }
+
+
+def measure(client, url, requests, headers=None):
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    sa.event.listen(sa.engine.Engine, "before_cursor_execute", count)
+    timings, counts = [], []
+    try:
+        for _ in range(requests):
+            queries[0] = 0
+            start = perf_counter()
+            response = client.get(url, headers=headers)
+            timings.append((perf_counter() - start) * 1000)
+            counts.append(queries[0])
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+    finally:
+        sa.event.remove(sa.engine.Engine, "before_cursor_execute", count)
+    p50, p95 = (quantiles(timings, n=100)[i] for i in (49, 94))
+    return {
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "queries_per_request": sum(counts) / len(counts),
+    }
+
+
+def endpoints(seed=42):
+    rng = random.Random(seed)
+    user = db.session.scalar(db.select(User).order_by(User.following_count.desc()))
+    popular = db.session.scalar(db.select(User).order_by(User.followers_count.desc()))
+    pages = (
+        db.session.scalar(db.select(sa.func.count(Post.id)))
+        // current_app.config["POSTS_PER_PAGE"]
+    )
+    token = user.get_token()
+    db.session.commit()
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+    api = {"Authorization": f"Bearer {token}"}
+    urls = {
+        "index": ("/", None),
+        "explore": ("/explore", None),
+        "explore_deep": (f"/explore?page={max(pages // 2, 1)}", None),
+        "search": (f"/search?q={rng.choice(WORDS)[:4]}", None),
+        "profile": (f"/user/{popular.username}", None),
+        "notifications": ("/user/notifications", None),
+        "api_users": ("/api/users?per_page=100", api),
+        "api_followers": (f"/api/users/{user.id}/followers?per_page=100", api),
+    }
+    return client, urls
+
+
+def run(requests=50, seed=42):
+    client, urls = endpoints(seed)
+    return {
+        name: measure(client, url, requests, headers)
+        for name, (url, headers) in urls.items()
+    }
+
+
+def login_rate(seconds=5, threads=None):
+    hasher = current_app.password_hasher
+    password_hash = hasher.hash("password")
+    threads = threads or hasher.workers
+    deadline = perf_counter() + seconds
+
+    def login(_):
+        logins = 0
+        while perf_counter() < deadline:
+            hasher.check(password_hash, "password")
+            logins += 1
+        return logins
+
+    start = perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        logins = sum(pool.map(login, range(threads)))
+    rate = logins / (perf_counter() - start)
+    cores = min(threads, hasher.workers, os.cpu_count() or 1)
+    return {
+        "method": hasher.method,
+        "logins_per_second": rate,
+        "per_core": rate / cores,
+    }
+
+
+def sleep_job(ms):
+    sleep(ms / 1000)
+
+
+def queue_throughput(connection, jobs=200, bulk_share=0.8, bulk_ms=5, seed=42):
+    rng = random.Random(seed)
+    kinds = ["bulk" if rng.random() < bulk_share else "high" for _ in range(jobs)]
+    topologies = {
+        "single": {"high": "default", "bulk": "default"},
+        "priority": {"high": "high", "bulk": "bulk"},
+    }
+    results = {}
+    for topology, routes in topologies.items():
+        queues = {
+            name: rq.Queue(f"microblog-bench-{topology}-{name}", connection=connection)
+            for name in ("high", "default", "bulk")
+        }
+        enqueued = [
+            (
+                kind,
+                queues[routes[kind]]
+                .enqueue(sleep_job, bulk_ms if kind == "bulk" else 0)
+                .id,
+            )
+            for kind in kinds
+        ]
+        start = perf_counter()
+        rq.SimpleWorker(list(queues.values()), connection=connection).work(
+            burst=True, logging_level="WARNING"
+        )
+        elapsed = perf_counter() - start
+        waits = defaultdict(list)
+        finished = rq.job.Job.fetch_many([id for _, id in enqueued], connection)
+        for (kind, _), job in zip(enqueued, finished):
+            waits[kind].append(
+                (job.started_at - job.enqueued_at).total_seconds() * 1000
+            )
+        results[topology] = {
+            "jobs_per_second": round(jobs / elapsed, 1),
+            **{f"{kind}_wait_p50_ms": round(median(w), 1) for kind, w in waits.items()},
+        }
+        for job in finished:
+            job.delete()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=basedir, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save(path, dataset, results):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "revision": git_revision(),
+                "timestamp": datetime.now(UTC).isoformat(),
+                "dataset": dataset,
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
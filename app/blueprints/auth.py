@@ -22,11 +22,12 @@ def login():
         return redirect(url_for("main.index"))
     form = LoginForm()
     if form.validate_on_submit():
-        user = db.session.scalar(db.select(User).filter_by(username=form.username.data))
+        user = User.get_by_username(form.username.data)
         if user is None or not user.check_password(form.password.data):
             flash("Invalid username or password")
             return redirect(url_for("auth.login"))
         login_user(user, remember=form.remember_me.data)
+        db.session.commit()
         next = request.args.get("next")
         if not next or urlsplit(next).netloc != "":
             next = url_for("main.index")
@@ -1,6 +1,8 @@
-from flask import Blueprint
+import click
+from flask import Blueprint, current_app
 
 from app.extensions import db
+from app.models import TimelineEntry, User
 
 commands = Blueprint("commands", __name__, cli_group=None)
 
@@ -13,6 +15,86 @@ def initdb():
     print("Database created.")
 
 
+@commands.cli.command()
+def upgradedb():
+    """Add missing tables, columns and indexes."""
+    from app.schema import upgrade
+
+    upgrade()
+    db.session.commit()
+    print("Database upgraded.")
+
+
+@commands.cli.command()
+def explain():
+    """Check that the hot queries use an index."""
+    from app.schema import explain, hot_queries, unindexed
+
+    failed = False
+    for name, statement in hot_queries().items():
+        plan = explain(statement)
+        problems = unindexed(plan)
+        failed = failed or bool(problems)
+        print(f"{name}: {'NOT INDEXED' if problems else 'ok'}")
+        for line in plan:
+            print(f"    {line}")
+    if failed:
+        raise SystemExit(1)
+
+
+@commands.cli.command()
+def syncreplica():
+    """Copy the primary SQLite database to the replica."""
+    from app.database import sync_replica
+
+    sync_replica()
+    print("Replica synced.")
+
+
+@commands.cli.command()
+def rebuildtimelines():
+    """Rebuild home timelines."""
+    TimelineEntry.rebuild()
+    db.session.commit()
+    print("Timelines rebuilt.")
+
+
+@commands.cli.command()
+def reconcilecounts():
+    """Recompute stored user counters."""
+    User.reconcile_counts()
+    db.session.commit()
+    print("Counters reconciled.")
+
+
+@commands.cli.command()
+def reindex():
+    """Rebuild the search index."""
+    current_app.search.reindex()
+    db.session.commit()
+    print("Search index rebuilt.")
+
+
+@commands.cli.command()
+def flushlastseen():
+    """Write buffered last seen times."""
+    print(f"{User.flush_last_seen()} users updated.")
+
+
+@commands.cli.command()
+@click.option("--queue", "-q", "queues", multiple=True, help="Queue names to read.")
+@click.option("--burst", is_flag=True, help="Stop when the queues are empty.")
+def worker(queues, burst):
+    """Run a task worker reading queues in priority order."""
+    from rq import Worker
+
+    names = queues or current_app.config["TASK_QUEUES"]
+    Worker(
+        [current_app.task_queues[name] for name in names],
+        connection=current_app.redis,
+    ).work(burst=burst, with_scheduler=True)
+
+
 @commands.cli.command()
 def initmail():
     """Start email server."""
@@ -21,3 +103,114 @@ def initmail():
     subprocess.call(
         "aiosmtpd -n -c aiosmtpd.handlers.Debugging -l localhost:8025", shell=True
     )
+
+
+@commands.cli.command("import")
+@click.option("--users", type=click.Path(exists=True), help="Users file.")
+@click.option("--follows", type=click.Path(exists=True), help="Follows file.")
+@click.option("--posts", type=click.Path(exists=True), help="Posts file.")
+@click.option("--messages", type=click.Path(exists=True), help="Messages file.")
+def import_(users, follows, posts, messages):
+    """Bulk import NDJSON or CSV files."""
+    from app.bulk import TABLES, load, prepare_users, read_rows, rebuild_derived
+
+    files = {"users": users, "follows": follows, "posts": posts, "messages": messages}
+    for name, path in files.items():
+        if path:
+            rows = read_rows(path)
+            load(TABLES[name], prepare_users(rows) if name == "users" else rows)
+    rebuild_derived()
+    db.session.commit()
+    print("Import finished.")
+
+
+@commands.cli.command()
+@click.option("--users", default=1000, help="Number of users to generate.")
+@click.option("--follows", default=20, help="Average follows per user.")
+@click.option("--posts", default=10000, help="Number of posts to generate.")
+@click.option("--messages", default=2000, help="Number of messages to generate.")
+@click.option("--seed", default=42, help="Random seed.")
+def seed(users, follows, posts, messages, seed):
+    """Fill an empty database with synthetic data."""
+    from app.bench import generate
+
+    generate(users, follows, posts, messages, seed)
+    print("Database seeded.")
+
+
+@commands.cli.command()
+@click.option("--users", default=1000, help="Number of users to generate.")
+@click.option("--follows", default=20, help="Average follows per user.")
+@click.option("--posts", default=10000, help="Number of posts to generate.")
+@click.option("--messages", default=2000, help="Number of messages to generate.")
+@click.option(
+    "--requests",
+    default=50,
+    type=click.IntRange(min=2),
+    help="Requests per endpoint (at least 2 for percentiles).",
+)
+@click.option("--seed", default=42, help="Random seed.")
+@click.option("--output", default="bench.json", help="Where to save results.")
+def bench(users, follows, posts, messages, requests, seed, output):
+    """Benchmark hot endpoints against a synthetic dataset."""
+    from app import create_app
+    from app.bench import BenchConfig, generate, run, save
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        dataset = generate(users, follows, posts, messages, seed)
+        results = run(requests, seed)
+    for name, result in results.items():
+        print(
+            f"{name:16} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms"
+            f"  {result['queries_per_request']:5.1f} queries"
+        )
+    save(output, dataset, results)
+    print(f"Results saved to {output}.")
+
+
+@commands.cli.command()
+@click.option("--seconds", default=5, help="How long to run.")
+@click.option("--threads", type=int, help="Concurrent logins (defaults to workers).")
+@click.option("--method", help="Hash method to test instead of the configured one.")
+def benchlogins(seconds, threads, method):
+    """Measure password checks per second."""
+    from app.bench import login_rate
+
+    if method:
+        current_app.password_hasher.method = method
+    result = login_rate(seconds, threads)
+    print(
+        f"{result['method']}: {result['logins_per_second']:.1f} logins/s,"
+        f" {result['per_core']:.1f} per core"
+    )
+
+
+@commands.cli.command()
+@click.option("--jobs", default=200, help="Number of jobs to enqueue.")
+@click.option("--bulk-share", default=0.8, help="Fraction of slow bulk jobs.")
+@click.option("--bulk-ms", default=5, help="Duration of each bulk job.")
+@click.option("--redis-url", help="Redis server to use instead of fakeredis.")
+def benchqueues(jobs, bulk_share, bulk_ms, redis_url):
+    """Compare single-queue and priority-queue workers under mixed load."""
+    from redis import Redis
+
+    from app.bench import queue_throughput
+
+    if redis_url:
+        connection = Redis.from_url(redis_url)
+    else:
+        try:
+            import fakeredis
+        except ImportError:
+            raise click.UsageError("Install fakeredis or pass --redis-url.")
+        connection = fakeredis.FakeRedis()
+    results = queue_throughput(connection, jobs, bulk_share, bulk_ms)
+    for topology, result in results.items():
+        print(
+            f"{topology:10} {result['jobs_per_second']:8.1f} jobs/s"
+            f"  high wait p50 {result.get('high_wait_p50_ms', 0):8.1f}ms"
+            f"  bulk wait p50 {result.get('bulk_wait_p50_ms', 0):8.1f}ms"
+        )
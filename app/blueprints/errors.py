@@ -15,7 +15,7 @@ def wants_json_response():
 @errors.app_errorhandler(400)
 def bad_request(error):
     if wants_json_response():
-        return api_error_response(404)
+        return api_error_response(400)
     return render_template("error/400.html"), 400
 
 
@@ -1,6 +1,4 @@
-from datetime import datetime, timezone
-
-import sqlalchemy as sa
+import sqlalchemy.orm as so
 from flask import (
     Blueprint,
     current_app,
@@ -13,9 +11,13 @@ from flask import (
 )
 from flask_login import current_user, login_required
 
+from app.cache import cached_fragment
+from app.emails import EXPORT_FORMATS
 from app.extensions import db
 from app.forms import EmptyForm, PostForm, SearchForm
-from app.models import Post, User
+from app.models import Post, TimelineEntry
+from app.pagination import paginate
+from app.search import SearchPagination
 
 main = Blueprint("main", __name__)
 
@@ -23,8 +25,7 @@ main = Blueprint("main", __name__)
 @main.before_app_request
 def before_app_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.now(timezone.utc)
-        db.session.commit()
+        current_user.ping()
         g.search_form = SearchForm()
         g.empty_form = EmptyForm()
 
@@ -34,13 +35,14 @@ def before_app_request():
 def index():
     form = PostForm()
     if form.validate_on_submit():
-        post = Post(body=form.post.data, author=current_user)
-        db.session.add(post)
+        current_user.add_post(form.post.data)
         db.session.commit()
         flash("Your post is now live!")
         return redirect(url_for("main.index"))
-    posts = db.paginate(
-        current_user.following_posts(), per_page=current_app.config["POSTS_PER_PAGE"]
+    posts = paginate(
+        current_user.timeline(),
+        [TimelineEntry.timestamp, TimelineEntry.post_id],
+        key=lambda post: (post.timestamp, post.id),
     )
     return render_template(
         "index.html",
@@ -53,14 +55,20 @@ def index():
 @main.get("/explore")
 @login_required
 def explore():
-    posts = db.paginate(
-        db.select(Post).order_by(Post.timestamp.desc()),
-        per_page=current_app.config["POSTS_PER_PAGE"],
+    posts_html = cached_fragment(
+        ["posts"],
+        lambda: render_template(
+            "_posts.html",
+            posts=paginate(
+                db.select(Post).options(so.selectinload(Post.author)),
+                [Post.timestamp, Post.id],
+            ),
+        ),
     )
     return render_template(
         "index.html",
         title="Explore",
-        posts=posts,
+        posts_html=posts_html,
     )
 
 
@@ -68,16 +76,7 @@ def explore():
 @login_required
 def search():
     q = request.args.get("q")
-    posts = db.paginate(
-        db.select(Post)
-        .filter(
-            sa.or_(
-                Post.body.like(f"%{q}%"), Post.author.has(User.username.like(f"%{q}%"))
-            )
-        )
-        .order_by(Post.timestamp.desc()),
-        per_page=current_app.config["POSTS_PER_PAGE"],
-    )
+    posts = SearchPagination(q=q, per_page=current_app.config["POSTS_PER_PAGE"])
 
     return render_template("search.html", title="Search", posts=posts, q=q)
 
@@ -85,9 +84,12 @@ def search():
 @main.get("/export-posts")
 @login_required
 def export_post():
-    if current_user.get_task_in_progress("export_posts"):
+    format = request.args.get("format", "json")
+    if format not in EXPORT_FORMATS:
+        flash(f"Unsupported export format {format}")
+    elif current_user.get_task_in_progress("export_posts"):
         flash("An export task is currently in progress")
     else:
-        current_user.launch_task("export_posts", "Exporting post...")
+        current_user.launch_task("export_posts", "Exporting post...", format)
         db.session.commit()
     return redirect(url_for("users.profile", username=current_user.username))
@@ -1,7 +1,10 @@
-from datetime import datetime, timezone
+import json
 
+import sqlalchemy.orm as so
 from flask import (
     Blueprint,
+    Response,
+    abort,
     current_app,
     flash,
     g,
@@ -12,9 +15,11 @@ from flask import (
 )
 from flask_login import current_user, login_required
 
+from app.cache import cached_fragment
 from app.extensions import db
 from app.forms import EditProfileForm, MessageForm
-from app.models import Message, Notification, Post, User
+from app.models import Message, Notification, Post, User, expire_fragments
+from app.pagination import paginate
 
 users = Blueprint("users", __name__)
 
@@ -22,16 +27,19 @@ users = Blueprint("users", __name__)
 @users.get("/<username>")
 @login_required
 def profile(username):
-    user = db.first_or_404(db.select(User).filter_by(username=username))
-    posts = db.paginate(
-        user.posts.select().order_by(Post.timestamp.desc()),
-        per_page=current_app.config["POSTS_PER_PAGE"],
+    user = User.get_by_username(username) or abort(404)
+    posts_html = cached_fragment(
+        [f"user:{user.id}"],
+        lambda: render_template(
+            "_posts.html",
+            posts=paginate(user.posts.select(), [Post.timestamp, Post.id]),
+        ),
     )
     return render_template(
         "user/index.html",
         title=username,
         user=user,
-        posts=posts,
+        posts_html=posts_html,
     )
 
 
@@ -40,8 +48,11 @@ def profile(username):
 def edit_profile():
     form = EditProfileForm(current_user.username)
     if form.validate_on_submit():
-        current_user.username = form.username.data
+        if form.username.data != current_user.username:
+            current_user.username = form.username.data
+            current_app.search.update_author(current_user)
         current_user.about_me = form.about_me.data
+        expire_fragments("posts", f"user:{current_user.id}")
         db.session.commit()
         flash("Your changes have been saved.")
         return redirect(url_for("users.edit_profile"))
@@ -54,7 +65,7 @@ def edit_profile():
 @login_required
 def follow(username):
     if g.empty_form.validate_on_submit():
-        user = db.session.scalar(db.select(User).filter_by(username=username))
+        user = User.get_by_username(username)
         if user is None:
             flash(f"User {username} not found.")
             return redirect(url_for("main.index"))
@@ -72,7 +83,7 @@ def follow(username):
 @login_required
 def unfollow(username):
     if g.empty_form.validate_on_submit():
-        user = db.session.scalar(db.select(User).filter_by(username=username))
+        user = User.get_by_username(username)
         if user is None:
             flash(f"User {username} not found.")
             return redirect(url_for("main.index"))
@@ -89,7 +100,7 @@ def unfollow(username):
 @users.get("/<username>/popup")
 @login_required
 def popup(username):
-    user = db.first_or_404(db.select(User).filter_by(username=username))
+    user = User.get_by_username(username) or abort(404)
     return render_template("user/popup.html", user=user)
 
 
@@ -97,11 +108,9 @@ def popup(username):
 @login_required
 def send_message(recipient):
     form = MessageForm()
-    user = db.first_or_404(db.select(User).filter_by(username=recipient))
+    user = User.get_by_username(recipient) or abort(404)
     if form.validate_on_submit():
-        message = Message(author=current_user, recipient=user, body=form.message.data)
-        db.session.add(message)
-        user.add_notification("unread_message_count", user.unread_message_count)
+        current_user.send_message(user, form.message.data)
         db.session.commit()
         flash("Your message has been sent.")
         return redirect(url_for("users.profile", username=recipient))
@@ -113,26 +122,47 @@ def send_message(recipient):
 @users.get("/messages")
 @login_required
 def messages():
-    current_user.last_message_read_time = datetime.now(timezone.utc)
-    current_user.add_notification("unread_message_count", 0)
+    current_user.read_messages()
     db.session.commit()
-    messages = db.paginate(
-        current_user.messages_received.select().order_by(Message.timestamp.desc()),
-        per_page=current_app.config["POSTS_PER_PAGE"],
+    messages = paginate(
+        current_user.messages_received.select().options(
+            so.selectinload(Message.author)
+        ),
+        [Message.timestamp, Message.id],
     )
     return render_template("user/messages.html", title="Messages", messages=messages)
 
 
+def pending_notifications():
+    since = request.headers.get("Last-Event-ID", type=float) or request.args.get(
+        "since", 0.0, type=float
+    )
+    return [
+        n.to_dict()
+        for n in db.session.scalars(
+            current_user.notifications.select()
+            .filter(Notification.timestamp > since)
+            .order_by(Notification.timestamp.asc())
+        )
+    ]
+
+
+def sse_event(n):
+    return f"id: {n['timestamp']}\ndata: {json.dumps(n)}\n\n"
+
+
 @users.get("/notifications")
 @login_required
 def notifications():
-    since = request.args.get("since", 0.0, type=float)
-    notifications = db.session.scalars(
-        current_user.notifications.select()
-        .filter(Notification.timestamp > since)
-        .order_by(Notification.timestamp.asc())
+    return pending_notifications()
+
+
+@users.get("/notifications/stream")
+@login_required
+def notification_stream():
+    retry = current_app.config["NOTIFICATION_STREAM_RETRY"] * 1000
+    return Response(
+        f"retry: {retry}\n\n" + "".join(map(sse_event, pending_notifications())),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
     )
-    return [
-        {"name": n.name, "data": n.get_data(), "timestamp": n.timestamp}
-        for n in notifications
-    ]
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from time import perf_counter
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app.extensions import db
+from app.models import Message, Post, TimelineEntry, User, followers
+
+TABLES = {
+    "users": User.__table__,
+    "follows": followers,
+    "posts": Post.__table__,
+    "messages": Message.__table__,
+}
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        if os.path.splitext(path)[1] == ".csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def converters(table):
+    types = {}
+    for column in table.columns:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            continue
+        if python_type is datetime:
+            types[column.name] = datetime.fromisoformat
+        elif python_type in (int, float):
+            types[column.name] = python_type
+    return types
+
+
+def convert(value, type):
+    if type is not None and isinstance(value, str):
+        return type(value)
+    return value
+
+
+def prepare_users(rows):
+    hashes = {}
+    for row in rows:
+        password = row.pop("password", None)
+        if not row.get("password_hash") and password:
+            if password not in hashes:
+                hashes[password] = current_app.password_hasher.hash(password)
+            row["password_hash"] = hashes[password]
+        yield row
+
+
+@contextmanager
+def indexes_disabled(table):
+    connection = db.session.connection()
+    indexes = [index for index in table.indexes if not index.unique]
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+    try:
+        yield
+    except Exception:
+        db.session.rollback()
+        connection = db.session.connection()
+        raise
+    finally:
+        for index in indexes:
+            index.create(connection, checkfirst=True)
+
+
+def load(table, rows, batch_size=None, report=print):
+    batch_size = batch_size or current_app.config["BULK_BATCH_SIZE"]
+    types = converters(table)
+    columns = set(table.columns.keys())
+    statement = sa.insert(table)
+    rows = iter(rows)
+    total, start = 0, perf_counter()
+    with indexes_disabled(table):
+        while batch := list(islice(rows, batch_size)):
+            groups = defaultdict(list)
+            for row in batch:
+                row = {
+                    k: convert(v, types.get(k))
+                    for k, v in row.items()
+                    if k in columns and v != ""
+                }
+                groups[frozenset(row)].append(row)
+            for group in groups.values():
+                db.session.execute(statement, group)
+            total += len(batch)
+            elapsed = perf_counter() - start
+            report(f"{table.name}: {total} rows ({total / elapsed:.0f} rows/s)")
+    return total
+
+
+def rebuild_derived():
+    TimelineEntry.rebuild()
+    User.reconcile_counts()
+    current_app.search.reindex()
+    if current_app.graph is not None:
+        current_app.graph.reindex()
@@ -0,0 +1,228 @@
+import json
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic, sleep, time
+from urllib.parse import urlencode
+
+import redis
+from flask import current_app, request
+from markupsafe import Markup
+
+
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is not None and item[1] < monotonic():
+                del self.data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.data[key] = (value, monotonic() + (ttl or self.ttl))
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class TokenCache:
+    channel = "token-revoked"
+
+    def __init__(self, maxsize, ttl, connection, shared=False):
+        self.local = TTLCache(maxsize, ttl)
+        self.redis = connection
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.listener = None
+        self.failed_at = float("-inf")
+        self.lock = Lock()
+
+    def listening(self):
+        if self.listener is None or not self.listener.is_alive():
+            with self.lock:
+                if self.listener is None or not self.listener.is_alive():
+                    self.local.clear()
+                    try:
+                        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                        pubsub.subscribe(**{self.channel: self.revoked})
+                    except redis.exceptions.RedisError:
+                        self.failed_at = monotonic()
+                        return False
+                    self.listener = pubsub.run_in_thread(
+                        sleep_time=1, daemon=True, exception_handler=self.disconnected
+                    )
+        return monotonic() - self.failed_at > self.local.ttl
+
+    def revoked(self, message):
+        self.local.delete(message["data"].decode())
+
+    def disconnected(self, error, pubsub, thread):
+        self.failed_at = monotonic()
+        self.local.clear()
+        sleep(1)
+
+    def get(self, token):
+        entry = self.local.get(token) if self.listening() else None
+        if entry is None and self.shared:
+            entry = self.get_shared(token)
+        if entry is None or entry[1] <= time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def get_shared(self, token):
+        try:
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.exists(f"token-revoked:{token}")
+                pipe.get(f"token:{token}")
+                revoked, value = pipe.execute()
+        except redis.exceptions.RedisError:
+            return None
+        if revoked or value is None:
+            return None
+        user_id, expiration = value.decode().split(":")
+        entry = (int(user_id), float(expiration))
+        self.local.set(token, entry)
+        return entry
+
+    def set(self, token, user_id, expiration):
+        ttl = min(self.local.ttl, expiration - time())
+        if ttl <= 0:
+            return
+        self.local.set(token, (user_id, expiration), ttl)
+        if self.shared:
+            try:
+                self.redis.set(
+                    f"token:{token}", f"{user_id}:{expiration}", ex=max(int(ttl), 1)
+                )
+            except redis.exceptions.RedisError:
+                pass
+
+    def delete(self, token):
+        self.local.delete(token)
+        try:
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(f"token-revoked:{token}", 1, ex=2 * self.local.ttl)
+                pipe.delete(f"token:{token}")
+                pipe.publish(self.channel, token)
+                pipe.execute()
+        except redis.exceptions.RedisError:
+            pass
+
+
+class ChangeLog:
+    def __init__(self, connection, name, size=10000):
+        self.redis = connection
+        self.key = f"{name}:changes"
+        self.counter = f"{name}:version"
+        self.size = size
+
+    def version(self):
+        return int(self.redis.get(self.counter) or 0)
+
+    def append(self, changes):
+        def append(pipe):
+            version = int(pipe.get(self.counter) or 0)
+            pipe.multi()
+            pipe.set(self.counter, version + len(changes))
+            pipe.zadd(
+                self.key,
+                {
+                    json.dumps([version + i, change]): version + i
+                    for i, change in enumerate(changes, 1)
+                },
+            )
+            pipe.zremrangebyrank(self.key, 0, -self.size - 1)
+
+        self.redis.transaction(append, self.counter)
+
+    def since(self, version):
+        with self.redis.pipeline() as pipe:
+            pipe.get(self.counter)
+            pipe.zrange(self.key, 0, 0, withscores=True)
+            pipe.zrangebyscore(self.key, f"({version}", "+inf")
+            latest, oldest, entries = pipe.execute()
+        latest = int(latest or 0)
+        if latest < version or (
+            latest > version and (not oldest or oldest[0][1] > version + 1)
+        ):
+            return None
+        return latest, [json.loads(entry)[1] for entry in entries]
+
+
+class FragmentCache:
+    def __init__(self, maxsize, ttl, connection=None):
+        self.local = TTLCache(maxsize, ttl)
+        self.versions = {}
+        self.redis = connection
+
+    def version(self, name):
+        try:
+            return int(self.redis.get(f"fragment-version:{name}") or 0)
+        except redis.exceptions.RedisError:
+            return self.versions.get(name, 0)
+
+    def bump(self, *names):
+        for name in names:
+            self.versions[name] = self.versions.get(name, 0) + 1
+        try:
+            with self.redis.pipeline(transaction=False) as pipe:
+                for name in names:
+                    pipe.incr(f"fragment-version:{name}")
+                pipe.execute()
+        except redis.exceptions.RedisError:
+            pass
+
+    def key(self, path, versions):
+        return f"fragment:{path}:" + ":".join(
+            f"{name}={self.version(name)}" for name in versions
+        )
+
+    def get(self, key):
+        try:
+            value = self.redis.get(key)
+        except redis.exceptions.RedisError:
+            return self.local.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        try:
+            self.redis.set(key, value, ex=self.local.ttl)
+        except redis.exceptions.RedisError:
+            self.local.set(key, value)
+
+
+def cached_fragment(versions, render, args=("page", "after", "before")):
+    cache = current_app.fragment_cache
+    params = dict(request.view_args)
+    params.update((k, request.args[k]) for k in args if k in request.args)
+    key = cache.key(f"{request.endpoint}?{urlencode(sorted(params.items()))}", versions)
+    html = cache.get(key)
+    if html is None:
+        html = render()
+        cache.set(key, html)
+    return Markup(html)
@@ -1,4 +1,5 @@
 import os
+from typing import ClassVar
 
 basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
@@ -7,13 +8,84 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 
     SQLALCHEMY_DATABASE_URI = os.getenv(
-        "DATABSE_URL", "sqlite:///" + os.path.join(basedir, "db.sqlite")
+        "DATABASE_URL",
+        os.getenv("DATABSE_URL", "sqlite:///" + os.path.join(basedir, "db.sqlite")),
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+    DATABASE_REPLICA_PIN = 5
+
+    DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+    DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "20"))
+    DATABASE_POOL_RECYCLE = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+    SQLITE_PRAGMAS: ClassVar[dict] = {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "wal"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "normal"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024))),
+    }
+
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_ALLOWED_IPS: ClassVar[list] = [
+        ip for ip in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if ip
+    ]
+    METRICS_INTERVAL = 5
+    SLOW_REQUEST_THRESHOLD = (
+        float(os.getenv("SLOW_REQUEST_THRESHOLD"))
+        if os.getenv("SLOW_REQUEST_THRESHOLD")
+        else None
+    )
 
     POSTS_PER_PAGE = 5
+    CURSOR_PAGINATION = os.getenv("CURSOR_PAGINATION", "").lower() in ("1", "true")
+
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND")
+    GRAPH_BACKEND = os.getenv("GRAPH_BACKEND")
+
+    TASK_QUEUES: ClassVar[dict] = {
+        "high": "microblog-high",
+        "default": "microblog-tasks",
+        "bulk": "microblog-bulk",
+    }
+    TASKS: ClassVar[dict] = {
+        "flush_last_seen": {"queue": "high", "job_timeout": 60, "result_ttl": 0},
+        "send_messages": {"queue": "high", "job_timeout": 300, "result_ttl": 0},
+        "export_posts": {"queue": "bulk", "job_timeout": 3600, "result_ttl": 3600},
+    }
+    TASK_PROGRESS_INTERVAL = 2
+    TASK_PROGRESS_TTL = 24 * 3600
+    EXPORT_BATCH_SIZE = 1000
+    BULK_BATCH_SIZE = 5000
+
+    NOTIFICATION_STREAM_TIMEOUT = 300
+    NOTIFICATION_STREAM_KEEPALIVE = 15
+    NOTIFICATION_STREAM_RETRY = 10
+
+    LAST_SEEN_INTERVAL = 60
+    LAST_SEEN_FLUSH_INTERVAL = 60
+
+    TOKEN_CACHE_SIZE = 1024
+    TOKEN_CACHE_TTL = 60
+    TOKEN_CACHE_REDIS = os.getenv("TOKEN_CACHE_REDIS", "").lower() in ("1", "true")
+    PASSWORD_CACHE_TTL = 60
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(
+        os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))
+    )
+    PASSWORD_HASH_QUEUE = 16
+    PASSWORD_HASH_TIMEOUT = 5
+    FRAGMENT_CACHE_SIZE = 256
+    FRAGMENT_CACHE_TTL = 300
 
     REDIS_URL = os.getenv("REDIS_URL", "redis://")
 
     MAIL_SERVER = os.getenv("MAIL_SERVER", "localhost")
-    MAIL_PORT = os.getenv("MAIL_PORT", 8025)
+    MAIL_PORT = int(os.getenv("MAIL_PORT", "8025"))
+    MAIL_WORKERS = 2
+    MAIL_QUEUE_SIZE = 100
+    MAIL_BATCH_SIZE = 20
+    MAIL_RETRIES = 3
+    MAIL_RETRY_BACKOFF = 1
+    MAIL_IDLE_TIMEOUT = 30
+    MAIL_USE_RQ = os.getenv("MAIL_USE_RQ", "").lower() in ("1", "true")
@@ -0,0 +1,105 @@
+from functools import partial
+from time import time
+
+import sqlalchemy as sa
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+PRIMARY = {"primary": True}
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, primary=False, **kwargs):
+        if bind is None and "replica" in self._db.engines:
+            if getattr(clause, "is_dml", False):
+                self.info["primary"] = True
+            elif not primary and not self._flushing and self.use_replica(clause):
+                return self._db.engines["replica"]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def use_replica(self, clause):
+        if isinstance(clause, sa.TextClause):
+            if not clause.text.lstrip().upper().startswith("SELECT"):
+                return False
+        elif not getattr(clause, "is_select", False):
+            return False
+        return (
+            has_request_context()
+            and request.method in READ_METHODS
+            and not self.info.get("primary")
+            and session.get("primary_until", 0) < time()
+        )
+
+
+@sa.event.listens_for(RoutingSession, "after_flush")
+def use_primary(db_session, flush_context):
+    db_session.info["primary"] = True
+
+
+@sa.event.listens_for(RoutingSession, "after_commit")
+def pin_primary(db_session):
+    if (
+        db_session.info.get("primary")
+        and has_request_context()
+        and "replica" in db_session._db.engines
+    ):
+        session["primary_until"] = time() + current_app.config["DATABASE_REPLICA_PIN"]
+
+
+def engine_options(config, url):
+    if sa.engine.make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": config["DATABASE_POOL_SIZE"],
+        "max_overflow": config["DATABASE_MAX_OVERFLOW"],
+        "pool_pre_ping": True,
+        "pool_recycle": config["DATABASE_POOL_RECYCLE"],
+    }
+
+
+def set_sqlite_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def init_db(app):
+    from app.extensions import db
+
+    config = app.config
+    config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(config, config["SQLALCHEMY_DATABASE_URI"]),
+    )
+    replica = config["DATABASE_REPLICA_URL"]
+    if replica:
+        config.setdefault(
+            "SQLALCHEMY_BINDS",
+            {"replica": {"url": replica, **engine_options(config, replica)}},
+        )
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite":
+                sa.event.listen(
+                    engine,
+                    "connect",
+                    partial(set_sqlite_pragmas, config["SQLITE_PRAGMAS"]),
+                )
+
+
+def sync_replica():
+    from app.extensions import db
+
+    primary, replica = db.engines[None], db.engines["replica"]
+    if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+        raise RuntimeError("Only SQLite replicas can be synced locally.")
+    source, target = primary.raw_connection(), replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        source.close()
+        target.close()
+    replica.dispose()
@@ -1,26 +1,151 @@
-import json
-from threading import Thread
+import atexit
+import smtplib
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import sleep
 
+import redis
 from flask import current_app, render_template
 from flask_mailman import EmailMessage
 
+from app.extensions import mail
+from app.queues import enqueue
 
-def _send_async_mail(app, message):
-    with app.app_context():
-        message.send()
 
+def transient(error):
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return isinstance(error, smtplib.SMTPServerDisconnected)
+    return isinstance(error, OSError)
 
-def send_mail(subject, body, to, attachments=None, sync=False):
-    app = current_app._get_current_object()
+
+class MailDispatcher:
+    def __init__(self, app):
+        self.app = app
+        self.queue = Queue(app.config["MAIL_QUEUE_SIZE"])
+        self.workers = []
+        self.lock = Lock()
+
+    def start(self):
+        with self.lock:
+            if self.workers:
+                return
+            for _ in range(self.app.config["MAIL_WORKERS"]):
+                worker = Thread(target=self._run, daemon=True)
+                worker.start()
+                self.workers.append(worker)
+            atexit.register(self.stop)
+
+    def stop(self, timeout=10):
+        for _ in self.workers:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except Full:
+                break
+        for worker in self.workers:
+            worker.join(timeout)
+
+    def submit(self, message):
+        self.start()
+        try:
+            self.queue.put_nowait(message)
+            return
+        except Full:
+            current_app.logger.warning("Mail queue is full, sending through RQ")
+        try:
+            enqueue("send_messages", [message])
+        except redis.exceptions.RedisError:
+            current_app.logger.exception(
+                "Dropped mail to %s", ", ".join(message.recipients())
+            )
+
+    def _run(self):
+        config = self.app.config
+        with self.app.app_context():
+            connection = None
+            while True:
+                try:
+                    message = self.queue.get(timeout=config["MAIL_IDLE_TIMEOUT"])
+                except Empty:
+                    connection = self._close(connection)
+                    continue
+                batch = [message]
+                while message is not None and len(batch) < config["MAIL_BATCH_SIZE"]:
+                    try:
+                        message = self.queue.get_nowait()
+                    except Empty:
+                        break
+                    batch.append(message)
+                messages = [message for message in batch if message is not None]
+                connection = self.send_messages(messages, connection)
+                for _ in batch:
+                    self.queue.task_done()
+                if None in batch:
+                    self._close(connection)
+                    return
+
+    def _close(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+    def send(self, messages):
+        self._close(self.send_messages(messages))
+
+    def send_messages(self, messages, connection=None):
+        for message in messages:
+            try:
+                connection = self.send_message(message, connection)
+            except Exception:
+                connection = None
+                current_app.logger.exception(
+                    "Failed to send mail to %s", ", ".join(message.recipients())
+                )
+        return connection
+
+    def send_message(self, message, connection=None):
+        retries = current_app.config["MAIL_RETRIES"]
+        backoff = current_app.config["MAIL_RETRY_BACKOFF"]
+        for attempt in range(retries + 1):
+            try:
+                if connection is None:
+                    connection = mail.get_connection()
+                    connection.open()
+                connection.send_messages([message])
+                return connection
+            except Exception as error:
+                self._close(connection)
+                connection = None
+                if attempt == retries or not transient(error):
+                    raise
+                sleep(backoff * 2**attempt)
+
+
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def send_mail(subject, body, to, attachments=None, files=None, sync=False):
     message = EmailMessage(subject, body, to=[to])
     message.content_subtype = "html"
     if attachments:
         for attachment in attachments:
             message.attach(*attachment)
+    if files:
+        for file in files:
+            message.attach_file(*file)
     if sync:
-        message.send()
+        current_app.mail_dispatcher.send([message])
+    elif current_app.config["MAIL_USE_RQ"]:
+        enqueue("send_messages", [message])
     else:
-        Thread(target=_send_async_mail, args=[app, message]).start()
+        current_app.mail_dispatcher.submit(message)
 
 
 def send_password_reset_mail(user):
@@ -32,13 +157,11 @@ def send_password_reset_mail(user):
     )
 
 
-def send_posts_export_email(user, data):
+def send_posts_export_email(user, path, format):
     send_mail(
         "[Microblog] Your blog posts",
         render_template("email/export_posts.html", user=user),
         to=user.email,
-        attachments=[
-            ("posts.json", json.dumps({"posts": data}, indent=4), "application/json")
-        ],
+        files=[(path, EXPORT_FORMATS[format])],
         sync=True,
     )
@@ -4,7 +4,9 @@ from flask_mailman import Mail
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from app.database import PRIMARY, RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 login = LoginManager()
 bootstrap = Bootstrap5()
 moment = Moment()
@@ -15,7 +17,7 @@ mail = Mail()
 def load_user(id):
     from app.models import User
 
-    return db.session.get(User, id)
+    return db.session.get(User, id, bind_arguments=PRIMARY)
 
 
 login.login_view = "auth.login"
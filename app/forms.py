@@ -23,7 +23,7 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField("Register")
 
     def validate_username(self, username):
-        user = db.session.scalar(db.select(User).filter_by(username=username.data))
+        user = User.get_by_username(username.data)
         if user is not None:
             raise ValidationError("Please use a different username.")
 
@@ -44,9 +44,7 @@ class EditProfileForm(FlaskForm):
 
     def validate_username(self, username):
         if username.data != self.original_username:
-            user = db.session.scalar(
-                db.select(User).filter_by(username=self.username.data)
-            )
+            user = User.get_by_username(self.username.data)
             if user is not None:
                 raise ValidationError("Please use a different username.")
 
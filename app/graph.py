@@ -0,0 +1,232 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from threading import Lock
+
+import redis
+import sqlalchemy as sa
+
+from app.cache import ChangeLog
+from app.extensions import db
+
+
+def _edges():
+    from app.models import followers
+
+    return db.session.execute(
+        db.select(followers.c.follower_id, followers.c.following_id)
+        .order_by(followers.c.follower_id, followers.c.following_id)
+        .execution_options(yield_per=10000)
+    )
+
+
+def _window(ids, after=None, before=None, limit=None):
+    if before is not None:
+        end = bisect_left(ids, before)
+        return list(ids[max(end - limit, 0) if limit else 0 : end])
+    start = bisect_right(ids, after) if after is not None else 0
+    return list(ids[start : start + limit if limit else None])
+
+
+def _rank(candidates, limit):
+    return [
+        id for id, _ in sorted(candidates.items(), key=lambda c: (-c[1], c[0]))[:limit]
+    ]
+
+
+class MemoryGraph:
+    def __init__(self, connection):
+        self.out = defaultdict(lambda: array("q"))
+        self.inc = defaultdict(lambda: array("q"))
+        self.changes = ChangeLog(connection, "graph")
+        self.version = 0
+        self.lock = Lock()
+        self.loaded = False
+
+    def preload(self):
+        try:
+            self.load()
+        except sa.exc.DBAPIError:
+            db.session.rollback()
+
+    def load(self):
+        try:
+            version = self.changes.version()
+        except redis.exceptions.RedisError:
+            version = 0
+        out, inc = defaultdict(lambda: array("q")), defaultdict(lambda: array("q"))
+        for follower_id, following_id in _edges():
+            out[follower_id].append(following_id)
+            inc[following_id].append(follower_id)
+        with self.lock:
+            self.out, self.inc, self.version = out, inc, version
+            self.loaded = True
+
+    def reindex(self):
+        self.load()
+        self.publish([["reload"]])
+
+    def publish(self, changes):
+        try:
+            self.changes.append(changes)
+        except redis.exceptions.RedisError:
+            with self.lock:
+                self._apply(changes)
+
+    def _apply(self, changes):
+        for change, follower_id, following_id in changes:
+            for ids, id in (
+                (self.out[follower_id], following_id),
+                (self.inc[following_id], follower_id),
+            ):
+                i = bisect_left(ids, id)
+                present = i < len(ids) and ids[i] == id
+                if change == "follow" and not present:
+                    insort(ids, id)
+                elif change == "unfollow" and present:
+                    del ids[i]
+
+    def sync(self):
+        if not self.loaded:
+            self.load()
+            return
+        start = self.version
+        try:
+            if self.changes.version() == start:
+                return
+            result = self.changes.since(start)
+        except redis.exceptions.RedisError:
+            return
+        if result is None or ["reload"] in result[1]:
+            self.load()
+            return
+        version, changes = result
+        with self.lock:
+            if self.version == start:
+                self._apply(changes)
+                self.version = version
+
+    def following(self, user_id, after=None, before=None, limit=None):
+        self.sync()
+        return _window(self.out.get(user_id, ()), after, before, limit)
+
+    def followers(self, user_id, after=None, before=None, limit=None):
+        self.sync()
+        return _window(self.inc.get(user_id, ()), after, before, limit)
+
+    def mutual(self, user_id):
+        self.sync()
+        followers = set(self.inc.get(user_id, ()))
+        return [id for id in self.out.get(user_id, ()) if id in followers]
+
+    def suggestions(self, user_id, limit=10):
+        self.sync()
+        following = self.out.get(user_id, ())
+        exclude = set(following)
+        exclude.add(user_id)
+        candidates = Counter()
+        for id in following:
+            candidates.update(c for c in self.out.get(id, ()) if c not in exclude)
+        return _rank(candidates, limit)
+
+
+class RedisGraph:
+    def __init__(self, connection):
+        self.redis = connection
+        self.loaded = False
+
+    def _key(self, direction, user_id):
+        return f"graph:{direction}:{user_id}"
+
+    def load(self, batch_size=10000):
+        for key in self.redis.scan_iter("graph:*"):
+            self.redis.delete(key)
+        self._load(batch_size)
+
+    def _load(self, batch_size=10000):
+        pipe = self.redis.pipeline(transaction=False)
+        for i, (follower_id, following_id) in enumerate(_edges(), 1):
+            pipe.zadd(self._key("following", follower_id), {following_id: following_id})
+            pipe.zadd(self._key("followers", following_id), {follower_id: follower_id})
+            if i % batch_size == 0:
+                pipe.execute()
+        pipe.set("graph:loaded", 1)
+        pipe.execute()
+        self.loaded = True
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            if self.redis.exists("graph:loaded"):
+                self.loaded = True
+            else:
+                self._load()
+
+    def preload(self):
+        pass
+
+    def reindex(self):
+        self.load()
+
+    def publish(self, changes):
+        with self.redis.pipeline(transaction=False) as pipe:
+            for change, follower_id, following_id in changes:
+                following = self._key("following", follower_id)
+                followers = self._key("followers", following_id)
+                if change == "follow":
+                    pipe.zadd(following, {following_id: following_id})
+                    pipe.zadd(followers, {follower_id: follower_id})
+                else:
+                    pipe.zrem(following, following_id)
+                    pipe.zrem(followers, follower_id)
+            pipe.execute()
+
+    def _window(self, key, after=None, before=None, limit=None):
+        self._ensure_loaded()
+        if before is not None:
+            ids = self.redis.zrevrangebyscore(
+                key, f"({before}", "-inf", start=0, num=limit or -1
+            )[::-1]
+        else:
+            ids = self.redis.zrangebyscore(
+                key,
+                f"({after}" if after is not None else "-inf",
+                "+inf",
+                start=0,
+                num=limit or -1,
+            )
+        return [int(id) for id in ids]
+
+    def following(self, user_id, after=None, before=None, limit=None):
+        return self._window(self._key("following", user_id), after, before, limit)
+
+    def followers(self, user_id, after=None, before=None, limit=None):
+        return self._window(self._key("followers", user_id), after, before, limit)
+
+    def mutual(self, user_id):
+        self._ensure_loaded()
+        ids = self.redis.zinter(
+            [self._key("following", user_id), self._key("followers", user_id)]
+        )
+        return sorted(int(id) for id in ids)
+
+    def suggestions(self, user_id, limit=10):
+        following = self.following(user_id)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for id in following:
+                pipe.zrange(self._key("following", id), 0, -1)
+            results = pipe.execute()
+        exclude = set(following)
+        exclude.add(user_id)
+        candidates = Counter()
+        for ids in results:
+            candidates.update(c for c in map(int, ids) if c not in exclude)
+        return _rank(candidates, limit)
+
+
+def create_graph(app):
+    backend = app.config["GRAPH_BACKEND"]
+    if backend == "memory":
+        return MemoryGraph(app.redis)
+    if backend == "redis":
+        return RedisGraph(app.redis)
+    return None
@@ -0,0 +1,196 @@
+import hmac
+from collections import defaultdict
+from threading import Lock
+from time import perf_counter
+
+import redis
+import sqlalchemy as sa
+from flask import Response, abort, current_app, g, has_request_context, request
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = Lock()
+        self.pending = defaultdict(int)
+        self.reported = defaultdict(int)
+        self.flushed_at = perf_counter()
+        self.listening = False
+
+    def init_app(self, app):
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule("/metrics", "metrics", self.view)
+        if not self.listening:
+            sa.event.listen(
+                sa.engine.Engine, "before_cursor_execute", self.before_cursor_execute
+            )
+            sa.event.listen(
+                sa.engine.Engine, "after_cursor_execute", self.after_cursor_execute
+            )
+            sa.event.listen(sa.engine.Engine, "handle_error", self.handle_error)
+            self.listening = True
+
+    def before_cursor_execute(self, conn, cursor, statement, params, context, many):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, params, context, many):
+        elapsed = perf_counter() - conn.info["query_start"].pop()
+        if has_request_context() and "request_start" in g:
+            g.query_count += 1
+            g.query_time += elapsed
+
+    def handle_error(self, context):
+        if context.connection is not None and context.connection.info.get(
+            "query_start"
+        ):
+            context.connection.info["query_start"].pop()
+
+    def before_request(self):
+        g.request_start = perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+
+    def after_request(self, response):
+        if "request_start" not in g:
+            return response
+        elapsed = perf_counter() - g.request_start
+        endpoint = request.endpoint or "unknown"
+        with self.lock:
+            self.pending["requests", endpoint] += 1
+            self.pending["queries", endpoint] += g.query_count
+            self.pending["sql_time", endpoint] += g.query_time
+            self.pending["latency_sum", endpoint] += elapsed
+            for bound in BUCKETS:
+                if elapsed <= bound:
+                    self.pending[f"latency:{bound}", endpoint] += 1
+        threshold = current_app.config["SLOW_REQUEST_THRESHOLD"]
+        if threshold is not None and elapsed > threshold:
+            current_app.logger.warning(
+                "Slow request %s %s: %.3fs, %d queries, %.3fs in SQL",
+                request.method,
+                request.path,
+                elapsed,
+                g.query_count,
+                g.query_time,
+            )
+        if perf_counter() - self.flushed_at >= current_app.config["METRICS_INTERVAL"]:
+            self.flush()
+        return response
+
+    def flush(self):
+        from app.api.auth import password_cache
+
+        caches = {"token": current_app.token_cache, "password": password_cache}
+        with self.lock:
+            for name, cache in caches.items():
+                for result, attr in (("hit", "hits"), ("miss", "misses")):
+                    value = getattr(cache, attr)
+                    self.pending["cache", f"{name}:{result}"] += (
+                        value - self.reported[name, result]
+                    )
+                    self.reported[name, result] = value
+            pending, self.pending = self.pending, defaultdict(int)
+            self.flushed_at = perf_counter()
+        try:
+            with current_app.redis.pipeline(transaction=False) as pipe:
+                for (key, field), value in pending.items():
+                    if isinstance(value, float):
+                        pipe.hincrbyfloat(f"metrics:{key}", field, value)
+                    elif value:
+                        pipe.hincrby(f"metrics:{key}", field, value)
+                pipe.execute()
+        except redis.exceptions.RedisError:
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending[key] += value
+
+    def load(self):
+        keys = [
+            "requests",
+            "queries",
+            "sql_time",
+            "latency_sum",
+            "cache",
+            *(f"latency:{bound}" for bound in BUCKETS),
+        ]
+        with current_app.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hgetall(f"metrics:{key}")
+            values = pipe.execute()
+        return {
+            key: {field.decode(): number(value) for field, value in hash.items()}
+            for key, hash in zip(keys, values)
+        }
+
+    def render(self):
+        self.flush()
+        data = self.load()
+        lines = []
+
+        def family(name, type, samples):
+            lines.append(f"# TYPE {name} {type}")
+            for labels, value in samples:
+                lines.append(f"{name}{labels} {value}")
+
+        def label(endpoint, **extra):
+            labels = {"endpoint": endpoint, **extra}
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+        family(
+            "microblog_requests_total",
+            "counter",
+            [(label(e), n) for e, n in data["requests"].items()],
+        )
+        family(
+            "microblog_sql_queries_total",
+            "counter",
+            [(label(e), n) for e, n in data["queries"].items()],
+        )
+        family(
+            "microblog_sql_seconds_total",
+            "counter",
+            [(label(e), t) for e, t in data["sql_time"].items()],
+        )
+        lines.append("# TYPE microblog_request_duration_seconds histogram")
+        for e, count in data["requests"].items():
+            name = "microblog_request_duration_seconds"
+            for bound in BUCKETS:
+                n = data[f"latency:{bound}"].get(e, 0)
+                lines.append(f"{name}_bucket{label(e, le=bound)} {n}")
+            lines.append(f"{name}_bucket{label(e, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{label(e)} {data['latency_sum'].get(e, 0)}")
+            lines.append(f"{name}_count{label(e)} {count}")
+        samples = []
+        for field, n in data["cache"].items():
+            cache, result = field.split(":")
+            samples.append((f'{{cache="{cache}",result="{result}"}}', n))
+        family("microblog_cache_requests_total", "counter", samples)
+        return "\n".join(lines) + "\n"
+
+    def authorized(self):
+        token = current_app.config["METRICS_TOKEN"]
+        if token and hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(),
+            f"Bearer {token}".encode(),
+        ):
+            return True
+        return request.remote_addr in current_app.config["METRICS_ALLOWED_IPS"]
+
+    def view(self):
+        if not self.authorized():
+            abort(403)
+        try:
+            body = self.render()
+        except redis.exceptions.RedisError:
+            abort(503)
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
+
+metrics = Metrics()
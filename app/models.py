@@ -7,19 +7,36 @@ from typing import Optional
 
 import jwt
 import redis
-import rq
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from flask import current_app, url_for
+from flask import current_app, g, has_request_context, url_for
 from flask_login import UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+from sqlalchemy.dialects import postgresql, sqlite
 
+from app.cache import TTLCache
+from app.database import PRIMARY
 from app.extensions import db
+from app.pagination import KeysetPagination, decode_cursor
+from app.queues import enqueue, enqueue_in
+
+last_seen_buffered = TTLCache(maxsize=10000)
+
+UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def supports_upsert():
+    return db.session.get_bind().dialect.name in UPSERTS
+
+
+def upsert(entity):
+    return UPSERTS[db.session.get_bind().dialect.name](entity)
+
 
 followers = db.Table(
     "followers",
     sa.Column("follower_id", sa.ForeignKey("user.id"), primary_key=True),
     sa.Column("following_id", sa.ForeignKey("user.id"), primary_key=True),
+    sa.Index("ix_followers_following_id_follower_id", "following_id", "follower_id"),
 )
 
 
@@ -60,66 +77,220 @@ class User(UserMixin, db.Model):
         sa.String(32), index=True, unique=True
     )
     token_expiration: so.Mapped[Optional[datetime]]
+    posts_count: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
+    followers_count: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
+    following_count: so.Mapped[int] = so.mapped_column(default=0, server_default="0")
+    unread_message_count: so.Mapped[int] = so.mapped_column(
+        default=0, server_default="0"
+    )
+
+    @staticmethod
+    def get_by_username(username):
+        users = g.setdefault("users", {}) if has_request_context() else {}
+        if username not in users:
+            users[username] = db.session.scalar(
+                db.select(User).filter_by(username=username)
+            )
+        return users[username]
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = current_app.password_hasher.hash(password)
 
     def check_password(self, password):
-        if self.password_hash:
-            return check_password_hash(self.password_hash, password)
+        hasher = current_app.password_hasher
+        if self.password_hash and hasher.check(self.password_hash, password):
+            if hasher.needs_rehash(self.password_hash):
+                self.set_password(password)
+            return True
+        return False
+
+    def ping(self):
+        if last_seen_buffered.get(self.id):
+            return
+        last_seen_buffered.set(self.id, True, current_app.config["LAST_SEEN_INTERVAL"])
+        window = current_app.config["LAST_SEEN_FLUSH_INTERVAL"]
+        try:
+            with current_app.redis.pipeline(transaction=False) as pipe:
+                pipe.hset("last_seen", self.id, time())
+                pipe.set("last_seen:flush", 1, nx=True, ex=window)
+                _, scheduled = pipe.execute()
+            if scheduled:
+                enqueue_in(timedelta(seconds=window), "flush_last_seen")
+        except redis.exceptions.RedisError:
+            self.last_seen = datetime.now(timezone.utc)
+            db.session.commit()
+
+    @staticmethod
+    def flush_last_seen():
+        with current_app.redis.pipeline() as pipe:
+            pipe.hgetall("last_seen")
+            pipe.delete("last_seen")
+            seen, _ = pipe.execute()
+        if seen:
+            db.session.execute(
+                sa.update(User),
+                [
+                    {
+                        "id": int(id),
+                        "last_seen": datetime.fromtimestamp(float(ts), timezone.utc),
+                    }
+                    for id, ts in seen.items()
+                ],
+            )
+            db.session.commit()
+        return len(seen)
 
     def avatar(self, size=128):
         digest = md5(self.email.lower().encode("utf-8")).hexdigest()
         return f"https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}"
 
     def follow(self, user):
-        if not self.is_following(user):
-            self.following.add(user)
+        values = {"follower_id": self.id, "following_id": user.id}
+        if supports_upsert():
+            statement = upsert(followers).values(values).on_conflict_do_nothing()
+        else:
+            statement = sa.insert(followers).from_select(
+                list(values),
+                sa.select(*map(sa.literal, values.values())).where(
+                    ~sa.exists().where(
+                        followers.c.follower_id == self.id,
+                        followers.c.following_id == user.id,
+                    )
+                ),
+            )
+        result = db.session.execute(statement)
+        if result.rowcount:
+            self.following_count = User.following_count + 1
+            user.followers_count = User.followers_count + 1
+            TimelineEntry.backfill(self, user)
+            db.session.info.setdefault("graph", []).append(["follow", self.id, user.id])
+        self._following_cache()[user.id] = True
 
     def unfollow(self, user):
-        if self.is_following(user):
-            self.following.remove(user)
-
-    def is_following(self, user):
-        return (
-            db.session.scalar(self.following.select().filter_by(id=user.id)) is not None
-        )
-
-    @property
-    def followers_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.followers.select().subquery())
+        result = db.session.execute(
+            sa.delete(followers).where(
+                followers.c.follower_id == self.id,
+                followers.c.following_id == user.id,
+            )
         )
+        if result.rowcount:
+            self.following_count = User.following_count - 1
+            user.followers_count = User.followers_count - 1
+            TimelineEntry.trim(self, user)
+            db.session.info.setdefault("graph", []).append(
+                ["unfollow", self.id, user.id]
+            )
+        self._following_cache()[user.id] = False
 
-    @property
-    def following_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.following.select().subquery())
-        )
+    def is_following(self, user):
+        return user.id in self.following_set([user.id])
+
+    def _following_cache(self):
+        cache = g.setdefault("following", {}) if has_request_context() else {}
+        return cache.setdefault(self.id, {})
+
+    def following_set(self, user_ids):
+        cache = self._following_cache()
+        missing = {id for id in user_ids if id not in cache}
+        if missing:
+            found = set(
+                db.session.scalars(
+                    db.select(followers.c.following_id).where(
+                        followers.c.follower_id == self.id,
+                        followers.c.following_id.in_(missing),
+                    )
+                )
+            )
+            for id in missing:
+                cache[id] = id in found
+        return {id for id in user_ids if cache[id]}
+
+    def relation_query(
+        self, relation, per_page, page=None, after=None, before=None, count=False
+    ):
+        graph = current_app.graph
+        if graph is not None and page is None and not count:
+            after, before = (
+                decode_cursor(cursor, [User.id]) if cursor else None
+                for cursor in (after, before)
+            )
+            try:
+                ids = getattr(graph, relation)(
+                    self.id,
+                    after=after[0] if after else None,
+                    before=before[0] if before else None,
+                    limit=per_page + 1,
+                )
+            except redis.exceptions.RedisError:
+                pass
+            else:
+                return db.select(User).where(User.id.in_(ids))
+        return getattr(self, relation).select()
+
+    def suggestions(self, limit=10):
+        ids = None
+        if current_app.graph is not None:
+            try:
+                ids = current_app.graph.suggestions(self.id, limit)
+            except redis.exceptions.RedisError:
+                pass
+        if ids is None:
+            Following = followers.alias()
+            ids = db.session.scalars(
+                db.select(Following.c.following_id)
+                .join(followers, followers.c.following_id == Following.c.follower_id)
+                .where(
+                    followers.c.follower_id == self.id,
+                    Following.c.following_id != self.id,
+                    Following.c.following_id.not_in(
+                        db.select(followers.c.following_id).where(
+                            followers.c.follower_id == self.id
+                        )
+                    ),
+                )
+                .group_by(Following.c.following_id)
+                .order_by(sa.func.count().desc(), Following.c.following_id)
+                .limit(limit)
+            ).all()
+        users = {
+            user.id: user
+            for user in db.session.scalars(db.select(User).where(User.id.in_(ids)))
+        }
+        return [users[id] for id in ids if id in users]
 
-    def following_posts(self):
-        Author = so.aliased(User)
-        Follower = so.aliased(User)
+    def timeline(self):
         return (
             db.select(Post)
-            .join(Post.author.of_type(Author))
-            .join(Author.followers.of_type(Follower), isouter=True)
-            .where(sa.or_(Follower.id == self.id, Author.id == self.id))
-            .group_by(Post)
-            .order_by(Post.timestamp.desc())
+            .options(so.selectinload(Post.author))
+            .join(TimelineEntry, TimelineEntry.post_id == Post.id)
+            .where(TimelineEntry.user_id == self.id)
+            .order_by(TimelineEntry.timestamp.desc(), TimelineEntry.post_id.desc())
         )
 
-    @property
-    def unread_message_count(self):
-        last_read_time = self.last_message_read_time or datetime(1900, 1, 1)
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(
-                db.select(Message)
-                .filter_by(recipient=self)
-                .filter(Message.timestamp > last_read_time)
-                .subquery()
-            )
+    def add_post(self, body):
+        post = Post(body=body, author=self)
+        db.session.add(post)
+        self.posts_count = User.posts_count + 1
+        expire_fragments("posts", f"user:{self.id}")
+        db.session.flush()
+        TimelineEntry.fan_out(post)
+        current_app.search.add(post)
+        return post
+
+    def send_message(self, recipient, body):
+        message = Message(author=self, recipient=recipient, body=body)
+        db.session.add(message)
+        recipient.unread_message_count = User.unread_message_count + 1
+        db.session.flush()
+        recipient.add_notification(
+            "unread_message_count", recipient.unread_message_count
         )
+        return message
+
+    def read_messages(self):
+        self.last_message_read_time = datetime.now(timezone.utc)
+        self.unread_message_count = 0
+        self.add_notification("unread_message_count", 0)
 
     def get_reset_password_token(self, expires_in=600):
         return jwt.encode(
@@ -138,32 +309,81 @@ class User(UserMixin, db.Model):
             return
         return db.session.get(User, id)
 
+    @property
+    def notification_channel(self):
+        return Notification.channel(self.id)
+
     def add_notification(self, name, data):
-        db.session.execute(self.notifications.delete().filter_by(name=name))
-        n = Notification(name=name, payload=json.dumps(data), user=self)
-        db.session.add(n)
-        return n
+        Notification.notify([self.id], name, data)
 
     def launch_task(self, name, description, *args, **kwargs):
-        rq_job = current_app.task_queue.enqueue(
-            f"app.tasks.{name}", self.id, *args, **kwargs
+        rq_job = enqueue(
+            name,
+            self.id,
+            *args,
+            **kwargs,
+            meta={"channel": self.notification_channel},
         )
         task = Task(id=rq_job.get_id(), name=name, description=description, user=self)
         db.session.add(task)
         return task
 
     def get_tasks_in_progress(self):
-        return db.session.scalars(self.tasks.select().filter_by(complete=False))
+        tasks = db.session.scalars(
+            self.tasks.select().filter_by(complete=False), bind_arguments=PRIMARY
+        ).all()
+        Task.load_progress(tasks)
+        return tasks
 
     def get_task_in_progress(self, name):
         return db.session.scalar(
-            self.tasks.select().filter_by(name=name, complete=False)
+            self.tasks.select().filter_by(name=name, complete=False),
+            bind_arguments=PRIMARY,
         )
 
-    @property
-    def posts_count(self):
-        return db.session.scalar(
-            db.select(sa.func.count()).select_from(self.posts.select().subquery())
+    @staticmethod
+    def reconcile_counts():
+        counters = [
+            "posts_count",
+            "followers_count",
+            "following_count",
+            "unread_message_count",
+        ]
+
+        def increments(user_id, counter=None):
+            return db.select(
+                user_id.label("user_id"),
+                *(sa.literal(int(name == counter)).label(name) for name in counters),
+            )
+
+        Recipient = so.aliased(User)
+        rows = sa.union_all(
+            increments(User.id),
+            increments(Post.user_id, "posts_count"),
+            increments(followers.c.following_id, "followers_count"),
+            increments(followers.c.follower_id, "following_count"),
+            increments(Message.recipient_id, "unread_message_count")
+            .join(Recipient, Recipient.id == Message.recipient_id)
+            .where(
+                Message.timestamp
+                > sa.func.coalesce(
+                    Recipient.last_message_read_time, datetime(1900, 1, 1)
+                )
+            ),
+        ).subquery()
+        counts = (
+            db.select(
+                rows.c.user_id,
+                *(sa.func.sum(rows.c[name]).label(name) for name in counters),
+            )
+            .group_by(rows.c.user_id)
+            .subquery()
+        )
+        db.session.execute(
+            sa.update(User)
+            .where(User.id == counts.c.user_id)
+            .values({name: counts.c[name] for name in counters})
+            .execution_options(synchronize_session=False)
         )
 
     def to_dict(self, include_email=False):
@@ -194,7 +414,63 @@ class User(UserMixin, db.Model):
             self.set_password(data["password"])
 
     @staticmethod
-    def to_collection_dict(query, page, per_page, endpoint, **kwargs):
+    def to_collection_dict(
+        query,
+        per_page,
+        endpoint,
+        page=None,
+        after=None,
+        before=None,
+        count=False,
+        **kwargs,
+    ):
+        if page is not None:
+            return User._to_page_dict(query, page, per_page, endpoint, **kwargs)
+        resources = KeysetPagination(
+            query,
+            [User.id],
+            per_page,
+            after=after,
+            before=before,
+            desc=False,
+            count=count,
+        )
+        data = {
+            "items": [item.to_dict() for item in resources.items],
+            "_meta": {
+                "per_page": per_page,
+                "total_items": resources.total,
+            },
+            "_links": {
+                "self": url_for(
+                    endpoint, after=after, before=before, per_page=per_page, **kwargs
+                ),
+                "next": (
+                    url_for(
+                        endpoint,
+                        after=resources.next_cursor,
+                        per_page=per_page,
+                        **kwargs,
+                    )
+                    if resources.has_next
+                    else None
+                ),
+                "prev": (
+                    url_for(
+                        endpoint,
+                        before=resources.prev_cursor,
+                        per_page=per_page,
+                        **kwargs,
+                    )
+                    if resources.has_prev
+                    else None
+                ),
+            },
+        }
+        return data
+
+    @staticmethod
+    def _to_page_dict(query, page, per_page, endpoint, **kwargs):
         resources = db.paginate(query, page=page, per_page=per_page, error_out=False)
         data = {
             "items": [item.to_dict() for item in resources.items],
@@ -218,8 +494,12 @@ class User(UserMixin, db.Model):
 
     def get_token(self, expires_in=3600):
         now = datetime.now(timezone.utc)
-        if self.token and self.token_expiration > now + timedelta(seconds=60):
+        if self.token and self.token_expiration.replace(
+            tzinfo=timezone.utc
+        ) > now + timedelta(seconds=60):
             return self.token
+        if self.token:
+            expire_token(self.token)
         self.token = secrets.token_hex(16)
         self.token_expiration = now + timedelta(seconds=expires_in)
         db.session.add(self)
@@ -227,32 +507,118 @@ class User(UserMixin, db.Model):
 
     def revoke_token(self):
         self.token_expiration = datetime.now(timezone.utc) - timedelta(seconds=1)
+        expire_token(self.token)
+
+    @staticmethod
+    def reference(id):
+        """Return the user with this id without loading it until needed."""
+        user = db.session.identity_map.get(db.session.identity_key(User, id))
+        if user is None:
+            user = User(id=id)
+            so.make_transient_to_detached(user)
+            db.session.add(user)
+        return user
 
     @staticmethod
     def check_token(token):
+        user_id = current_app.token_cache.get(token)
+        if user_id is not None:
+            return User.reference(user_id)
         user = db.session.scalar(db.select(User).filter_by(token=token))
         if user and user.token_expiration.replace(tzinfo=timezone.utc) > datetime.now(
             timezone.utc
         ):
+            current_app.token_cache.set(
+                token,
+                user.id,
+                user.token_expiration.replace(tzinfo=timezone.utc).timestamp(),
+            )
             return user
 
 
 class Post(db.Model):
+    __table_args__ = (sa.Index("ix_post_user_id_timestamp", "user_id", "timestamp"),)
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.String(140))
     timestamp: so.Mapped[datetime] = so.mapped_column(
         index=True, default=lambda: datetime.now(timezone.utc)
     )
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"), index=True)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"))
     author: so.Mapped["User"] = so.relationship(back_populates="posts")
 
 
+class TimelineEntry(db.Model):
+    __tablename__ = "timeline_entry"
+    __table_args__ = (
+        sa.Index("ix_timeline_entry_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+    user_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey("user.id"), primary_key=True
+    )
+    post_id: so.Mapped[int] = so.mapped_column(
+        sa.ForeignKey("post.id"), primary_key=True
+    )
+    timestamp: so.Mapped[datetime]
+
+    @staticmethod
+    def fan_out(post):
+        entry = (sa.literal(post.id), sa.literal(post.timestamp, sa.DateTime))
+        db.session.execute(
+            sa.insert(TimelineEntry).from_select(
+                ["user_id", "post_id", "timestamp"],
+                db.select(followers.c.follower_id, *entry)
+                .where(followers.c.following_id == post.user_id)
+                .union_all(db.select(sa.literal(post.user_id), *entry)),
+            )
+        )
+
+    @staticmethod
+    def backfill(user, author):
+        db.session.execute(
+            sa.insert(TimelineEntry).from_select(
+                ["user_id", "post_id", "timestamp"],
+                db.select(sa.literal(user.id), Post.id, Post.timestamp).where(
+                    Post.user_id == author.id
+                ),
+            )
+        )
+
+    @staticmethod
+    def trim(user, author):
+        db.session.execute(
+            sa.delete(TimelineEntry).where(
+                TimelineEntry.user_id == user.id,
+                TimelineEntry.post_id.in_(
+                    db.select(Post.id).where(Post.user_id == author.id)
+                ),
+            )
+        )
+
+    @staticmethod
+    def rebuild():
+        db.session.execute(sa.delete(TimelineEntry))
+        db.session.execute(
+            sa.insert(TimelineEntry).from_select(
+                ["user_id", "post_id", "timestamp"],
+                db.select(Post.user_id, Post.id, Post.timestamp).union_all(
+                    db.select(followers.c.follower_id, Post.id, Post.timestamp).join(
+                        Post, Post.user_id == followers.c.following_id
+                    )
+                ),
+            )
+        )
+
+
 class Message(db.Model):
+    __table_args__ = (
+        sa.Index("ix_message_recipient_id_timestamp", "recipient_id", "timestamp"),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     sender_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"), index=True)
-    recipient_id: so.Mapped[int] = so.mapped_column(
-        sa.ForeignKey("user.id"), index=True
-    )
+    recipient_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"))
     body: so.Mapped[str] = so.mapped_column(sa.String(140))
     timestamp: so.Mapped[datetime] = so.mapped_column(
         index=True, default=lambda: datetime.now(timezone.utc)
@@ -266,9 +632,14 @@ class Message(db.Model):
 
 
 class Notification(db.Model):
+    __table_args__ = (
+        sa.Index("ix_notification_user_id_timestamp", "user_id", "timestamp"),
+        sa.Index("uq_notification_user_id_name", "user_id", "name", unique=True),
+    )
+
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(128), index=True)
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"), index=True)
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey("user.id"))
     timestamp: so.Mapped[float] = so.mapped_column(index=True, default=time)
     payload: so.Mapped[str]
     user: so.Mapped["User"] = so.relationship(back_populates="notifications")
@@ -276,8 +647,130 @@ class Notification(db.Model):
     def get_data(self):
         return json.loads(self.payload)
 
+    def to_dict(self):
+        return {"name": self.name, "data": self.get_data(), "timestamp": self.timestamp}
+
+    @staticmethod
+    def channel(user_id):
+        return f"notifications:{user_id}"
+
+    @staticmethod
+    def notify(users, name, data):
+        timestamp = time()
+        values = {"name": name, "payload": json.dumps(data), "timestamp": timestamp}
+        if isinstance(users, sa.Select):
+            rows = users.add_columns(*map(sa.literal, values.values())).where(sa.true())
+        elif users:
+            rows = [{"user_id": user_id, **values} for user_id in users]
+        else:
+            return []
+        if supports_upsert():
+            user_ids = Notification._upsert(rows, values)
+        else:
+            user_ids = Notification._replace(users, rows, values)
+        message = json.dumps({"name": name, "data": data, "timestamp": timestamp})
+        db.session.info.setdefault("notifications", []).extend(
+            (Notification.channel(user_id), message) for user_id in user_ids
+        )
+        return user_ids
+
+    @staticmethod
+    def _upsert(rows, values):
+        statement = upsert(Notification)
+        if isinstance(rows, sa.Select):
+            statement = statement.from_select(["user_id", *values], rows)
+        else:
+            statement = statement.values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "name"],
+            set_={
+                "payload": statement.excluded.payload,
+                "timestamp": statement.excluded.timestamp,
+            },
+        ).returning(Notification.user_id)
+        return db.session.scalars(statement).all()
+
+    @staticmethod
+    def _replace(users, rows, values):
+        db.session.execute(
+            sa.delete(Notification).where(
+                Notification.name == values["name"], Notification.user_id.in_(users)
+            )
+        )
+        if isinstance(rows, sa.Select):
+            db.session.execute(
+                sa.insert(Notification).from_select(["user_id", *values], rows)
+            )
+            return db.session.scalars(users).all()
+        db.session.execute(sa.insert(Notification), rows)
+        return [row["user_id"] for row in rows]
+
+
+def expire_fragments(*names):
+    db.session.info.setdefault("fragments", set()).update(names)
+
+
+def expire_token(token):
+    db.session.info.setdefault("tokens", set()).add(token)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def bump_fragment_versions(session):
+    names = session.info.pop("fragments", None)
+    if names:
+        current_app.fragment_cache.bump(*names)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def evict_tokens(session):
+    for token in session.info.pop("tokens", ()):
+        current_app.token_cache.delete(token)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def publish_notifications(session):
+    notifications = session.info.pop("notifications", [])
+    if notifications:
+        try:
+            with current_app.redis.pipeline(transaction=False) as pipe:
+                for channel, message in notifications:
+                    pipe.publish(channel, message)
+                pipe.execute()
+        except redis.exceptions.RedisError:
+            pass
+
+
+@sa.event.listens_for(so.Session, "after_rollback")
+def discard_pending(session):
+    session.info.pop("notifications", None)
+    session.info.pop("fragments", None)
+    session.info.pop("graph", None)
+    session.info.pop("search", None)
+    session.info.pop("tokens", None)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def update_search(session):
+    changes = session.info.pop("search", None)
+    if changes:
+        current_app.search.publish(changes)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def update_graph(session):
+    changes = session.info.pop("graph", None)
+    if changes and current_app.graph is not None:
+        try:
+            current_app.graph.publish(changes)
+        except redis.exceptions.RedisError:
+            pass
+
 
 class Task(db.Model):
+    __table_args__ = (
+        sa.Index("ix_task_user_id_complete_name", "user_id", "complete", "name"),
+    )
+
     id: so.Mapped[str] = so.mapped_column(sa.String(36), primary_key=True)
     name: so.Mapped[str] = so.mapped_column(sa.String(128), index=True)
     description: so.Mapped[Optional[str]] = so.mapped_column(sa.String(128))
@@ -285,13 +778,50 @@ class Task(db.Model):
     complete: so.Mapped[bool] = so.mapped_column(default=False)
     user: so.Mapped["User"] = so.relationship(back_populates="tasks")
 
-    def get_rq_job(self):
+    @staticmethod
+    def progress_key(id):
+        return f"task-progress:{id}"
+
+    @staticmethod
+    def set_progress(id, channel, progress):
+        message = json.dumps(
+            {
+                "name": "task_progress",
+                "data": {"task_id": id, "progress": progress},
+                "timestamp": time(),
+            }
+        )
+        try:
+            with current_app.redis.pipeline(transaction=False) as pipe:
+                pipe.hset(Task.progress_key(id), "progress", progress)
+                pipe.expire(
+                    Task.progress_key(id), current_app.config["TASK_PROGRESS_TTL"]
+                )
+                pipe.publish(channel, message)
+                pipe.execute()
+        except redis.exceptions.RedisError:
+            pass
+
+    @staticmethod
+    def clear_progress(id):
+        try:
+            current_app.redis.delete(Task.progress_key(id))
+        except redis.exceptions.RedisError:
+            pass
+
+    @staticmethod
+    def load_progress(tasks):
         try:
-            rq_job = rq.job.Job.fetch(self.id, connection=current_app.redis)
-        except (redis.exceptions.RedisError, rq.exceptions.NoSuchJobError):
-            return None
-        return rq_job
+            with current_app.redis.pipeline(transaction=False) as pipe:
+                for task in tasks:
+                    pipe.hget(Task.progress_key(task.id), "progress")
+                values = pipe.execute()
+        except redis.exceptions.RedisError:
+            values = [None] * len(tasks)
+        for task, value in zip(tasks, values):
+            task.progress = int(value or 0)
 
     def get_progress(self):
-        job = self.get_rq_job()
-        return job.meta.get("progress", 0) if job is not None else 100
+        if not hasattr(self, "progress"):
+            Task.load_progress([self])
+        return self.progress
@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import abort, current_app, request
+
+from app.extensions import db
+
+
+def encode_cursor(values):
+    data = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = []
+        for key, v in zip(keys, data, strict=True):
+            python_type = key.type.python_type
+            if python_type is datetime:
+                v = datetime.fromisoformat(v)
+            elif not isinstance(v, python_type) or isinstance(v, bool):
+                raise TypeError(f"expected {python_type.__name__} for {key.key}")
+            values.append(v)
+    except (ValueError, TypeError):
+        abort(400, "Invalid pagination cursor.")
+    return values
+
+
+class KeysetPagination:
+    def __init__(
+        self,
+        query,
+        keys,
+        per_page,
+        after=None,
+        before=None,
+        desc=True,
+        count=False,
+        key=None,
+    ):
+        self.per_page = per_page
+        self.key = key or (lambda item: tuple(getattr(item, k.key) for k in keys))
+        self.total = None
+        if count:
+            self.total = db.session.scalar(
+                db.select(sa.func.count()).select_from(query.order_by(None).subquery())
+            )
+
+        cursor = decode_cursor(before or after, keys) if before or after else None
+        backwards = cursor is not None and before is not None
+        if cursor is not None:
+            row = sa.tuple_(*keys)
+            bound = sa.tuple_(*(sa.literal(v, k.type) for k, v in zip(keys, cursor)))
+            query = query.where(row > bound if desc == backwards else row < bound)
+        order = [k.desc() if desc != backwards else k.asc() for k in keys]
+        items = db.session.scalars(
+            query.order_by(None).order_by(*order).limit(per_page + 1)
+        ).all()
+        more = len(items) > per_page
+        items = items[:per_page]
+        if backwards:
+            items.reverse()
+        self.items = items
+        self.has_next = bool(items) and (more if not backwards else cursor is not None)
+        self.has_prev = bool(items) and (more if backwards else cursor is not None)
+
+    def __iter__(self):
+        yield from self.items
+
+    @property
+    def next_cursor(self):
+        return encode_cursor(self.key(self.items[-1])) if self.has_next else None
+
+    @property
+    def prev_cursor(self):
+        return encode_cursor(self.key(self.items[0])) if self.has_prev else None
+
+
+def paginate(query, keys, key=None, desc=True):
+    per_page = current_app.config["POSTS_PER_PAGE"]
+    after = request.args.get("after")
+    before = request.args.get("before")
+    if current_app.config["CURSOR_PAGINATION"] or after or before:
+        return KeysetPagination(
+            query, keys, per_page, after=after, before=before, desc=desc, key=key
+        )
+    order = [k.desc() if desc else k.asc() for k in keys]
+    return db.paginate(query.order_by(None).order_by(*order), per_page=per_page)
@@ -0,0 +1,48 @@
+from threading import BoundedSemaphore
+
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """Caps concurrent password hashing; the work runs on the caller's thread."""
+
+    def __init__(self, app):
+        self.workers = workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.timeout = app.config["PASSWORD_HASH_TIMEOUT"]
+        self.running = BoundedSemaphore(workers)
+        self.waiting = BoundedSemaphore(workers + app.config["PASSWORD_HASH_QUEUE"])
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, method):
+        self._method = method
+        self.prefix = None
+
+    def _run(self, function, *args):
+        if not self.waiting.acquire(blocking=False):
+            raise ServiceUnavailable("Too many password checks in progress.")
+        try:
+            if not self.running.acquire(timeout=self.timeout):
+                raise ServiceUnavailable("Too many password checks in progress.")
+            try:
+                return function(*args)
+            finally:
+                self.running.release()
+        finally:
+            self.waiting.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        if self.prefix is None:
+            self.prefix = generate_password_hash("", self.method).split("$", 1)[0]
+        return password_hash.split("$", 1)[0] != self.prefix
@@ -0,0 +1,24 @@
+import rq
+from flask import current_app
+
+
+def create_queues(app):
+    return {
+        name: rq.Queue(queue, connection=app.redis)
+        for name, queue in app.config["TASK_QUEUES"].items()
+    }
+
+
+def _route(name):
+    options = dict(current_app.config["TASKS"].get(name, {}))
+    return current_app.task_queues[options.pop("queue", "default")], options
+
+
+def enqueue(name, *args, **kwargs):
+    queue, options = _route(name)
+    return queue.enqueue(f"app.tasks.{name}", *args, **options, **kwargs)
+
+
+def enqueue_in(delay, name, *args, **kwargs):
+    queue, options = _route(name)
+    return queue.enqueue_in(delay, f"app.tasks.{name}", *args, **options, **kwargs)
@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+
+from app.bulk import rebuild_derived
+from app.extensions import db
+from app.models import Message, Notification, Post, Task, followers
+
+DERIVED = {
+    "timeline_entry",
+    "post_fts",
+    "user.posts_count",
+    "user.followers_count",
+    "user.following_count",
+    "user.unread_message_count",
+}
+
+
+def upgrade(report=print):
+    connection = db.session.connection()
+    existing = set(sa.inspect(connection).get_table_names())
+    db.metadata.create_all(connection)
+    inspector = sa.inspect(connection)
+    created = set(inspector.get_table_names()) - existing
+    for table in db.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                report(f"Added column {table.name}.{column.name}.")
+                created.add(f"{table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+                report(f"Created index {index.name}.")
+        names = {index.name for index in table.indexes}
+        reflected = sa.Table(table.name, sa.MetaData(), autoload_with=connection)
+        for index in reflected.indexes:
+            if index.name not in names:
+                index.drop(connection)
+                report(f"Dropped index {index.name}.")
+    if created & DERIVED:
+        report("Rebuilding timelines, counters and indexes.")
+        rebuild_derived()
+    connection.exec_driver_sql("ANALYZE")
+
+
+def hot_queries(user_id=1):
+    return {
+        "profile posts": db.select(Post)
+        .filter_by(user_id=user_id)
+        .order_by(Post.timestamp.desc(), Post.id.desc()),
+        "followers count": db.select(sa.func.count()).where(
+            followers.c.following_id == user_id
+        ),
+        "unread messages": db.select(sa.func.count())
+        .select_from(Message)
+        .filter_by(recipient_id=user_id)
+        .filter(Message.timestamp > datetime(1900, 1, 1)),
+        "messages": db.select(Message)
+        .filter_by(recipient_id=user_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc()),
+        "notifications": db.select(Notification)
+        .filter_by(user_id=user_id)
+        .filter(Notification.timestamp > 0.0)
+        .order_by(Notification.timestamp.asc()),
+        "notification upsert": db.select(Notification).filter_by(
+            user_id=user_id, name="unread_message_count"
+        ),
+        "task in progress": db.select(Task).filter_by(
+            user_id=user_id, name="export_posts", complete=False
+        ),
+    }
+
+
+def explain(statement):
+    connection = db.session.connection()
+    sql = statement.compile(
+        dialect=connection.dialect, compile_kwargs={"literal_binds": True}
+    )
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in rows]
+    return [row[0] for row in connection.exec_driver_sql(f"EXPLAIN {sql}")]
+
+
+def unindexed(plan):
+    return [
+        line
+        for line in plan
+        if line.startswith("SCAN ")
+        and " INDEX " not in line
+        or line.startswith(("USE TEMP B-TREE", "Seq Scan", "Sort"))
+    ]
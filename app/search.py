@@ -0,0 +1,288 @@
+import math
+import re
+import sqlite3
+from bisect import bisect_left, insort
+from collections import defaultdict
+from threading import Lock
+
+import redis
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+
+from app.cache import ChangeLog
+from app.extensions import db
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def fts5_available():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def _indexed_posts():
+    from app.models import Post, User
+
+    return db.select(Post.id, Post.user_id, Post.body, User.username).join(Post.author)
+
+
+class FTSSearch:
+    def create(self, connection):
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(body, username)"
+        )
+
+    def drop(self, connection):
+        connection.exec_driver_sql("DROP TABLE IF EXISTS post_fts")
+
+    def add(self, post):
+        db.session.execute(
+            sa.text(
+                "INSERT INTO post_fts (rowid, body, username) "
+                "VALUES (:id, :body, :username)"
+            ),
+            {"id": post.id, "body": post.body, "username": post.author.username},
+        )
+
+    def update_author(self, user):
+        db.session.execute(
+            sa.text(
+                "UPDATE post_fts SET username = :username "
+                "WHERE rowid IN (SELECT id FROM post WHERE user_id = :id)"
+            ),
+            {"id": user.id, "username": user.username},
+        )
+
+    def preload(self):
+        pass
+
+    def reindex(self):
+        connection = db.session.connection()
+        self.drop(connection)
+        self.create(connection)
+        for rows in db.session.execute(_indexed_posts()).partitions(1000):
+            db.session.execute(
+                sa.text(
+                    "INSERT INTO post_fts (rowid, body, username) "
+                    "VALUES (:id, :body, :username)"
+                ),
+                [
+                    {"id": row.id, "body": row.body, "username": row.username}
+                    for row in rows
+                ],
+            )
+
+    def search(self, q, offset, limit):
+        terms = tokenize(q)
+        if not terms:
+            return [], 0
+        match = " ".join(f'"{term}"*' for term in terms)
+        ids = db.session.scalars(
+            sa.text(
+                "SELECT rowid FROM post_fts WHERE post_fts MATCH :match "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"
+            ),
+            {"match": match, "limit": limit, "offset": offset},
+        ).all()
+        total = db.session.scalar(
+            sa.text("SELECT count(*) FROM post_fts WHERE post_fts MATCH :match"),
+            {"match": match},
+        )
+        return ids, total
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.terms = []
+        self.docs = {}
+        self.authors = defaultdict(set)
+
+    def add(self, post_id, user_id, body, username):
+        self.remove(post_id)
+        self.docs[post_id] = (user_id, body, username)
+        self.authors[user_id].add(post_id)
+        for term in tokenize(body) + tokenize(username):
+            if term not in self.postings:
+                insort(self.terms, term)
+            postings = self.postings[term]
+            postings[post_id] = postings.get(post_id, 0) + 1
+
+    def remove(self, post_id):
+        doc = self.docs.pop(post_id, None)
+        if doc is None:
+            return
+        user_id, body, username = doc
+        self.authors[user_id].discard(post_id)
+        for term in set(tokenize(body) + tokenize(username)):
+            postings = self.postings[term]
+            postings.pop(post_id, None)
+            if not postings:
+                del self.postings[term]
+                del self.terms[bisect_left(self.terms, term)]
+
+    def rename(self, user_id, username):
+        for post_id in list(self.authors.get(user_id, ())):
+            _, body, _ = self.docs[post_id]
+            self.add(post_id, user_id, body, username)
+
+    def _expand(self, prefix):
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            yield self.terms[i]
+            i += 1
+
+    def search(self, terms):
+        scores = None
+        for prefix in terms:
+            term_scores = defaultdict(float)
+            for term in self._expand(prefix):
+                postings = self.postings[term]
+                idf = math.log(1 + len(self.docs) / len(postings))
+                for post_id, tf in postings.items():
+                    term_scores[post_id] += tf * idf
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    k: v + term_scores[k] for k, v in scores.items() if k in term_scores
+                }
+        return sorted(scores, key=lambda post_id: (-scores[post_id], -post_id))
+
+
+class MemorySearch:
+    def __init__(self, connection):
+        self.index = InvertedIndex()
+        self.changes = ChangeLog(connection, "search")
+        self.version = 0
+        self.lock = Lock()
+        self.loaded = False
+
+    def create(self, connection):
+        pass
+
+    def drop(self, connection):
+        pass
+
+    def preload(self):
+        try:
+            self.load()
+        except sa.exc.DBAPIError:
+            db.session.rollback()
+
+    def load(self):
+        try:
+            version = self.changes.version()
+        except redis.exceptions.RedisError:
+            version = 0
+        index = InvertedIndex()
+        for row in db.session.execute(_indexed_posts()):
+            index.add(*row)
+        with self.lock:
+            self.index, self.version = index, version
+            self.loaded = True
+
+    def add(self, post):
+        db.session.info.setdefault("search", []).append(
+            ["add", post.id, post.user_id, post.body, post.author.username]
+        )
+
+    def update_author(self, user):
+        db.session.info.setdefault("search", []).append(
+            ["rename", user.id, user.username]
+        )
+
+    def publish(self, changes):
+        try:
+            self.changes.append(changes)
+        except redis.exceptions.RedisError:
+            with self.lock:
+                self._apply(changes)
+
+    def reindex(self):
+        self.load()
+        self.publish([["reload"]])
+
+    def _apply(self, changes):
+        for change, *args in changes:
+            if change == "add":
+                self.index.add(*args)
+            elif change == "rename":
+                self.index.rename(*args)
+
+    def sync(self):
+        if not self.loaded:
+            self.load()
+            return
+        start = self.version
+        try:
+            if self.changes.version() == start:
+                return
+            result = self.changes.since(start)
+        except redis.exceptions.RedisError:
+            return
+        if result is None or ["reload"] in result[1]:
+            self.load()
+            return
+        version, changes = result
+        with self.lock:
+            if self.version == start:
+                self._apply(changes)
+                self.version = version
+
+    def search(self, q, offset, limit):
+        terms = tokenize(q)
+        if not terms:
+            return [], 0
+        self.sync()
+        with self.lock:
+            ranked = self.index.search(terms)
+        return ranked[offset : offset + limit], len(ranked)
+
+
+@sa.event.listens_for(db.metadata, "after_create")
+def create_search_index(target, connection, **kwargs):
+    current_app.search.create(connection)
+
+
+@sa.event.listens_for(db.metadata, "before_drop")
+def drop_search_index(target, connection, **kwargs):
+    current_app.search.drop(connection)
+
+
+def create_search(app):
+    backend = app.config["SEARCH_BACKEND"]
+    if backend is None:
+        uri = app.config["SQLALCHEMY_DATABASE_URI"]
+        backend = "fts" if uri.startswith("sqlite") and fts5_available() else "memory"
+    return FTSSearch() if backend == "fts" else MemorySearch(app.redis)
+
+
+class SearchPagination(Pagination):
+    def _query_items(self):
+        from app.models import Post
+
+        ids, self._total = current_app.search.search(
+            self._query_args["q"], (self.page - 1) * self.per_page, self.per_page
+        )
+        posts = {
+            p.id: p
+            for p in db.session.scalars(
+                db.select(Post)
+                .options(so.selectinload(Post.author))
+                .filter(Post.id.in_(ids))
+            )
+        }
+        return [posts[id] for id in ids if id in posts]
+
+    def _query_count(self):
+        return self._total
@@ -1,7 +1,10 @@
+import csv
+import json
+import os
 import sys
+import tempfile
 import time
 
-import sqlalchemy as sa
 from rq import get_current_job
 
 from app import create_app
@@ -16,36 +19,71 @@ app.app_context().push()
 def _set_task_progress(progress):
     job = get_current_job()
     if job:
-        job.meta["progress"] = progress
-        job.save_meta()
-        task = db.session.get(Task, job.get_id())
-        task.user.add_notification(
-            "task_progress", {"task_id": job.get_id(), "progress": progress}
-        )
         if progress >= 100:
+            task = db.session.get(Task, job.get_id())
+            task.user.add_notification(
+                "task_progress", {"task_id": job.get_id(), "progress": progress}
+            )
             task.complete = True
-        db.session.commit()
+            db.session.commit()
+            Task.clear_progress(job.get_id())
+        else:
+            Task.set_progress(job.get_id(), job.meta["channel"], progress)
+
+
+def flush_last_seen():
+    User.flush_last_seen()
+
+
+def send_messages(messages):
+    app.mail_dispatcher.send(messages)
 
 
-def export_posts(user_id):
+def _progress(items, total):
+    interval = app.config["TASK_PROGRESS_INTERVAL"]
+    reported, reported_at = 0, time.monotonic()
+    for i, item in enumerate(items, 1):
+        yield item
+        progress = min(100 * i // max(total, 1), 99)
+        if progress > reported and time.monotonic() - reported_at >= interval:
+            _set_task_progress(progress)
+            reported, reported_at = progress, time.monotonic()
+
+
+def _write_posts(f, format, posts):
+    if format == "csv":
+        writer = csv.DictWriter(f, fieldnames=["body", "timestamp"])
+        writer.writeheader()
+        writer.writerows(posts)
+    elif format == "ndjson":
+        for post in posts:
+            f.write(json.dumps(post) + "\n")
+    else:
+        f.write('{"posts": [')
+        for i, post in enumerate(posts):
+            f.write(("," if i else "") + "\n    " + json.dumps(post))
+        f.write("\n]}\n")
+
+
+def export_posts(user_id, format="json"):
     try:
         user = db.session.get(User, user_id)
         _set_task_progress(0)
-        data = []
-        i = 0
-        total_posts = db.session.scalar(
-            db.select(sa.func.count()).select_from(user.posts.select().subquery())
+        rows = db.session.execute(
+            db.select(Post.body, Post.timestamp)
+            .filter_by(user_id=user.id)
+            .order_by(Post.timestamp.asc())
+            .execution_options(yield_per=app.config["EXPORT_BATCH_SIZE"])
         )
-        for post in db.session.scalars(
-            user.posts.select().order_by(Post.timestamp.asc())
-        ):
-            data.append(
-                {"body": post.body, "timestamp": post.timestamp.isoformat() + "Z"}
-            )
-            time.sleep(5)
-            i += 1
-            _set_task_progress(100 * i // total_posts)
-        send_posts_export_email(user, data)
+        posts = (
+            {"body": body, "timestamp": timestamp.isoformat() + "Z"}
+            for body, timestamp in rows
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, f"posts.{format}")
+            with open(path, "w", newline="") as f:
+                _write_posts(f, format, _progress(posts, user.posts_count))
+            send_posts_export_email(user, path, format)
     except Exception:
         print("Unhandled exception", sys.exc_info())
     finally:
@@ -0,0 +1,52 @@
+import fakeredis
+import pytest
+import sqlalchemy as sa
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+
+
+class TestConfig(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    DATABASE_REPLICA_URL = None
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1"
+    MAIL_BACKEND = "locmem"
+
+
+def make_app(path):
+    class PathConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr("app.Redis", fakeredis.FakeRedis)
+        app = create_app(PathConfig)
+    app.redis.flushall()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    return make_app(tmp_path / "test.sqlite")
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def queries(app):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    sa.event.remove(engine, "before_cursor_execute", record)
@@ -0,0 +1,53 @@
+import pytest
+import sqlalchemy as sa
+
+from app.bench import endpoints, generate
+from app.extensions import db
+
+from .conftest import make_app
+
+pytest.importorskip("pytest_benchmark")
+
+ENDPOINTS = [
+    "index",
+    "explore",
+    "explore_deep",
+    "search",
+    "profile",
+    "notifications",
+    "api_users",
+    "api_followers",
+]
+
+
+@pytest.fixture(scope="module")
+def bench(tmp_path_factory):
+    app = make_app(tmp_path_factory.mktemp("bench") / "bench.sqlite")
+    with app.app_context():
+        generate(users=200, follows=10, posts=2000, messages=200)
+        client, urls = endpoints()
+    return app, client, urls
+
+
+@pytest.mark.parametrize("name", ENDPOINTS)
+def test_endpoint(benchmark, bench, name):
+    app, client, urls = bench
+    url, headers = urls[name]
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    def get():
+        queries[0] = 0
+        return client.get(url, headers=headers)
+
+    with app.app_context():
+        engine = db.engine
+    sa.event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = benchmark(get)
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", count)
+    assert response.status_code == 200
+    benchmark.extra_info["queries_per_request"] = queries[0]
@@ -0,0 +1,19 @@
+import sqlalchemy as sa
+
+from app.bulk import TABLES, load, read_rows
+from app.extensions import db
+from app.models import Post
+
+
+def test_empty_csv_cells_use_column_defaults(app, tmp_path):
+    users = tmp_path / "users.csv"
+    users.write_text("id,username,email\n1,author,author@example.com\n")
+    posts = tmp_path / "posts.csv"
+    posts.write_text("id,body,user_id,timestamp\n1,hello,1,\n")
+    with app.app_context():
+        load(TABLES["users"], read_rows(str(users)), report=lambda message: None)
+        load(TABLES["posts"], read_rows(str(posts)), report=lambda message: None)
+        db.session.commit()
+        post = db.session.scalar(sa.select(Post))
+    assert post.body == "hello"
+    assert post.timestamp is not None
@@ -0,0 +1,48 @@
+import base64
+import json
+
+import pytest
+
+from app.extensions import db
+from app.models import User
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def auth(app, client):
+    with app.app_context():
+        user = User(username="reader", email="reader@example.com")
+        db.session.add(user)
+        db.session.flush()
+        token = user.get_token()
+        db.session.commit()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+
+@pytest.mark.parametrize("per_page", [0, -1])
+def test_per_page_is_at_least_one(client, auth, per_page):
+    response = client.get(f"/api/users?per_page={per_page}")
+    assert response.status_code == 200
+    assert response.json["_meta"]["per_page"] == 1
+    assert len(response.json["items"]) == 1
+
+
+@pytest.mark.parametrize("param", ["after", "before"])
+def test_cursor_past_the_end_returns_an_empty_page(client, auth, param):
+    response = client.get(
+        f"/api/users?{param}={cursor([1 if param == 'after' else 0])}"
+    )
+    assert response.status_code == 200
+    assert response.json["items"] == []
+    assert response.json["_links"]["next"] is None
+    assert response.json["_links"]["prev"] is None
+
+
+@pytest.mark.parametrize(
+    "value", [cursor(["x"]), cursor([1, 2]), cursor(1), cursor([True]), "%%%"]
+)
+def test_malformed_cursor_is_rejected(client, auth, value):
+    assert client.get(f"/api/users?after={value}").status_code == 400
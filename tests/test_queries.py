@@ -0,0 +1,62 @@
+import pytest
+
+from app.extensions import db
+from app.models import User
+
+PAGES = [
+    "/",
+    "/explore",
+    "/user/viewer",
+    "/api/users",
+    "/api/users/1/followers",
+    "/api/users/1/following",
+]
+
+
+def add_user(username):
+    user = User(username=username, email=f"{username}@example.com")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def seed(app, start, count):
+    with app.app_context():
+        viewer = db.session.scalar(db.select(User).filter_by(username="viewer"))
+        for i in range(start, start + count):
+            author = add_user(f"author{i}")
+            viewer.follow(author)
+            author.follow(viewer)
+            author.add_post(f"post {i} by author")
+            viewer.add_post(f"post {i} by viewer")
+        db.session.commit()
+
+
+@pytest.fixture
+def viewer(app, client):
+    with app.app_context():
+        token = add_user("viewer").get_token()
+        db.session.commit()
+    client.post("/login", data={"username": "viewer", "password": "password"})
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+
+def count_queries(client, queries, path):
+    client.get(path)
+    queries.clear()
+    response = client.get(path)
+    assert response.status_code == 200
+    return len(queries)
+
+
+@pytest.mark.parametrize("path", PAGES)
+def test_query_count_does_not_grow_with_pages(
+    app, client, queries, viewer, monkeypatch, path
+):
+    monkeypatch.setattr(app.fragment_cache, "get", lambda key: None)
+    per_page = app.config["POSTS_PER_PAGE"]
+    seed(app, 0, 1)
+    one_page = count_queries(client, queries, path)
+    seed(app, 1, per_page * 4)
+    assert count_queries(client, queries, path) == one_page
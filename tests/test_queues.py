@@ -0,0 +1,31 @@
+import pytest
+import rq
+
+from app.bench import sleep_job
+from app.config import Config
+from app.queues import _route, enqueue
+
+
+@pytest.mark.parametrize("name", list(Config.TASKS))
+def test_enqueue_routes_task_to_configured_queue(app, name):
+    options = Config.TASKS[name]
+    with app.app_context():
+        job = enqueue(name)
+    assert job.origin == Config.TASK_QUEUES[options["queue"]]
+    assert job.func_name == f"app.tasks.{name}"
+    assert job.timeout == options["job_timeout"]
+
+
+def test_worker_drains_high_before_bulk(app):
+    with app.app_context():
+        bulk, _ = _route("export_posts")
+        high, _ = _route("send_messages")
+    jobs = [bulk.enqueue(sleep_job, 0) for _ in range(3)]
+    jobs += [high.enqueue(sleep_job, 0) for _ in range(3)]
+    queues = [app.task_queues[name] for name in Config.TASK_QUEUES]
+    rq.SimpleWorker(queues, connection=app.redis).work(
+        burst=True, logging_level="WARNING"
+    )
+    finished = rq.job.Job.fetch_many([job.id for job in jobs], app.redis)
+    order = sorted(finished, key=lambda job: job.started_at)
+    assert [job.origin for job in order] == [high.name] * 3 + [bulk.name] * 3
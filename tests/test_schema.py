@@ -0,0 +1,38 @@
+import pytest
+import sqlalchemy as sa
+
+from app.extensions import db
+from app.models import TimelineEntry, User
+from app.schema import explain, hot_queries, unindexed, upgrade
+
+
+@pytest.mark.parametrize("name", list(hot_queries()))
+def test_hot_query_uses_an_index(app, name):
+    with app.app_context():
+        upgrade(report=lambda message: None)
+        plan = explain(hot_queries()[name])
+        db.session.rollback()
+    assert unindexed(plan) == [], "\n".join(plan)
+
+
+def test_upgrade_rebuilds_derived_data(app):
+    with app.app_context():
+        author = User(username="author", email="author@example.com")
+        reader = User(username="reader", email="reader@example.com")
+        db.session.add_all([author, reader])
+        db.session.flush()
+        reader.follow(author)
+        author.add_post("hello")
+        db.session.commit()
+        connection = db.session.connection()
+        connection.exec_driver_sql("DROP TABLE timeline_entry")
+        connection.exec_driver_sql("ALTER TABLE user DROP COLUMN posts_count")
+        db.session.commit()
+
+        messages = []
+        upgrade(report=messages.append)
+        db.session.commit()
+
+        assert "Rebuilding timelines, counters and indexes." in messages
+        assert db.session.scalar(sa.select(sa.func.count(TimelineEntry.post_id))) == 2
+        assert db.session.get(User, author.id).posts_count == 1
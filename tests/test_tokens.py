@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from app.cache import TokenCache
+from app.extensions import db
+from app.models import User
+
+
+class CountingRedis:
+    def __init__(self, connection):
+        self.connection = connection
+        self.calls = 0
+
+    def __getattr__(self, name):
+        self.calls += 1
+        return getattr(self.connection, name)
+
+
+@pytest.fixture
+def token(app, client):
+    with app.app_context():
+        users = [User(username=name, email=f"{name}@example.com") for name in "ab"]
+        db.session.add_all(users)
+        db.session.flush()
+        token = users[0].get_token()
+        db.session.commit()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return token
+
+
+def test_cached_token_skips_redis_and_user_load(app, client, queries, token):
+    queries.clear()
+    assert client.get("/api/users/2").status_code == 200
+    miss = len(queries)
+    redis = app.token_cache.redis = CountingRedis(app.redis)
+    queries.clear()
+    assert client.get("/api/users/2").status_code == 200
+    assert len(queries) == miss - 1 == 1
+    assert redis.calls == 0
+
+
+def test_revocation_reaches_other_caches(app, token):
+    other = TokenCache(16, 60, app.redis)
+    other.listening()
+    with app.app_context():
+        user = db.session.get(User, 1)
+        other.set(token, user.id, user.token_expiration.timestamp() + 3600)
+        assert other.get(token) == user.id
+        user.revoke_token()
+        db.session.commit()
+    deadline = time.monotonic() + 5
+    while other.local.get(token) is not None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert other.get(token) is None